@@ -0,0 +1,105 @@
+"""normalize progress into task_progress and project_completion
+
+Revision ID: 0002_task_progress
+Revises: 0001_initial
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_task_progress'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('completed_projects', sa.JSON),
+    sa.column('task_completion', sa.JSON),
+)
+
+
+def upgrade():
+    task_progress = op.create_table(
+        'task_progress',
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('project_index', sa.Integer, primary_key=True),
+        sa.Column('task_index', sa.Integer, primary_key=True),
+        sa.Column('done', sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index('ix_task_progress_task', 'task_progress', ['project_index', 'task_index', 'done'])
+    project_completion = op.create_table(
+        'project_completion',
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('project_index', sa.Integer, primary_key=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+    # backfill from the JSON blobs, streaming users and inserting in batches
+    conn = op.get_bind()
+    result = conn.execution_options(stream_results=True).execute(
+        sa.select(users.c.id, users.c.completed_projects, users.c.task_completion)
+    )
+    progress_rows, completion_rows = [], []
+    # completions are listed by completed_at, so one second per position keeps
+    # the order of the old completed_projects list
+    migrated_at = datetime.utcnow().replace(microsecond=0)
+    for user_id, completed, tc in result:
+        for project_index, flags in (tc or {}).items():
+            for task_index, done in enumerate(flags or []):
+                progress_rows.append({'user_id': user_id, 'project_index': int(project_index), 'task_index': task_index, 'done': bool(done)})
+        for position, project_index in enumerate(dict.fromkeys(completed or [])):
+            completion_rows.append({'user_id': user_id, 'project_index': int(project_index),
+                                    'completed_at': migrated_at + timedelta(seconds=position)})
+        if len(progress_rows) >= BATCH_SIZE:
+            op.bulk_insert(task_progress, progress_rows)
+            progress_rows = []
+        if len(completion_rows) >= BATCH_SIZE:
+            op.bulk_insert(project_completion, completion_rows)
+            completion_rows = []
+    if progress_rows:
+        op.bulk_insert(task_progress, progress_rows)
+    if completion_rows:
+        op.bulk_insert(project_completion, completion_rows)
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('completed_projects')
+        batch_op.drop_column('task_completion')
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('completed_projects', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('task_completion', sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    completed = {}
+    for user_id, project_index in conn.execute(sa.text(
+        'SELECT user_id, project_index FROM project_completion ORDER BY user_id, completed_at, project_index'
+    )):
+        completed.setdefault(user_id, []).append(project_index)
+    progress = {}
+    for user_id, project_index, task_index, done in conn.execute(sa.text(
+        'SELECT user_id, project_index, task_index, done FROM task_progress ORDER BY user_id, project_index, task_index'
+    )):
+        flags = progress.setdefault(user_id, {}).setdefault(str(project_index), [])
+        while len(flags) <= task_index:
+            flags.append(False)
+        flags[task_index] = bool(done)
+    for user_id in set(completed) | set(progress):
+        conn.execute(
+            users.update().where(users.c.id == user_id).values(
+                completed_projects=completed.get(user_id, []),
+                task_completion=progress.get(user_id, {}),
+            )
+        )
+
+    op.drop_table('project_completion')
+    op.drop_index('ix_task_progress_task', table_name='task_progress')
+    op.drop_table('task_progress')
@@ -0,0 +1,22 @@
+"""index users by points for the leaderboard
+
+Revision ID: 0003_points_index
+Revises: 0002_task_progress
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_points_index'
+down_revision = '0002_task_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_points', 'users', [sa.text('points DESC'), 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_users_points', table_name='users')
@@ -0,0 +1,44 @@
+"""add analytics_counters for /api/admin/analytics
+
+Revision ID: 0005_analytics_counters
+Revises: 0004_user_version
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_analytics_counters'
+down_revision = '0004_user_version'
+branch_labels = None
+depends_on = None
+
+# same counts as rebuild_counters() in app.py
+BACKFILL = (
+    "INSERT INTO analytics_counters (metric, a, b, count) SELECT 'users', 0, 0, COUNT(*) FROM users",
+    "INSERT INTO analytics_counters (metric, a, b, count) "
+    "SELECT 'task_done', project_index, task_index, COUNT(*) FROM task_progress WHERE done "
+    "GROUP BY project_index, task_index",
+    "INSERT INTO analytics_counters (metric, a, b, count) "
+    "SELECT 'project_completed', project_index, 0, COUNT(*) FROM project_completion GROUP BY project_index",
+    "INSERT INTO analytics_counters (metric, a, b, count) "
+    "SELECT 'unlocked_index', unlocked_index, 0, COUNT(*) FROM users GROUP BY unlocked_index",
+    "INSERT INTO analytics_counters (metric, a, b, count) "
+    "SELECT 'points', points, 0, COUNT(*) FROM users GROUP BY points",
+)
+
+
+def upgrade():
+    op.create_table(
+        'analytics_counters',
+        sa.Column('metric', sa.String(32), primary_key=True),
+        sa.Column('a', sa.Integer, primary_key=True),
+        sa.Column('b', sa.Integer, primary_key=True),
+        sa.Column('count', sa.Integer, nullable=False),
+    )
+    for statement in BACKFILL:
+        op.execute(statement)
+
+
+def downgrade():
+    op.drop_table('analytics_counters')
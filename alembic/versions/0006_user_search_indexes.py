@@ -0,0 +1,28 @@
+"""index users for prefix search in /api/admin/users
+
+Revision ID: 0006_user_search_indexes
+Revises: 0005_analytics_counters
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0006_user_search_indexes'
+down_revision = '0005_analytics_counters'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('username', 'email', 'admission')
+
+
+def upgrade():
+    # same expression as app.search_key(): byte order on PostgreSQL so that
+    # prefix ranges are exact regardless of the database locale
+    collate = ' COLLATE "C"' if op.get_bind().dialect.name == 'postgresql' else ''
+    for column in COLUMNS:
+        op.execute(f"CREATE INDEX ix_users_{column}_search ON users (lower({column}){collate}, id)")
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_index(f"ix_users_{column}_search", table_name='users')
@@ -0,0 +1,83 @@
+"""Course-wide analytics kept as aggregate counters.
+
+``analytics_counters`` holds one row per ``(metric, a, b)``:
+
+- ``users``: total number of users
+- ``task_done`` ``(project_index, task_index)``: users who ticked that task
+- ``project_completed`` ``(project_index)``: users who completed the project
+- ``unlocked_index`` ``(index)``: users whose current project is ``index``
+- ``points`` ``(points)``: users with exactly that many points
+
+Progress endpoints collect their changes in a ``CounterDeltas`` and apply them
+in the same transaction as the progress write, so the admin report reads a
+table whose size depends on the course, not on the number of users.
+``flask --app app rebuild-analytics`` recomputes everything from the
+progress tables.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+
+class CounterDeltas:
+    """Counter changes made by one transaction."""
+
+    def __init__(self):
+        self.changes: Dict[Tuple[str, int, int], int] = defaultdict(int)
+
+    def add(self, metric: str, a: int = 0, b: int = 0, n: int = 1):
+        self.changes[(metric, a, b)] += n
+
+    def user_added(self, n: int = 1):
+        self.add('users', n=n)
+        self.add('unlocked_index', 0, n=n)
+        self.add('points', 0, n=n)
+
+    def user_moved(self, old_unlocked: int, old_points: int, new_unlocked: int, new_points: int):
+        if old_unlocked != new_unlocked:
+            self.add('unlocked_index', old_unlocked, n=-1)
+            self.add('unlocked_index', new_unlocked)
+        if old_points != new_points:
+            self.add('points', old_points, n=-1)
+            self.add('points', new_points)
+
+    def rows(self) -> List[dict]:
+        return [{'metric': m, 'a': a, 'b': b, 'count': n} for (m, a, b), n in sorted(self.changes.items()) if n]
+
+
+def _rate(count: int, users: int) -> float:
+    return round(count / users, 4) if users else 0.0
+
+
+def build_report(counters: Iterable[tuple], projects: list, project_tasks: list) -> dict:
+    """Shape ``(metric, a, b, count)`` rows into the ``/api/admin/analytics`` payload."""
+    tasks_done, completed, unlocked, points = {}, {}, {}, {}
+    users = 0
+    for metric, a, b, count in counters:
+        if metric == 'users':
+            users = count
+        elif metric == 'task_done':
+            tasks_done[(a, b)] = count
+        elif metric == 'project_completed':
+            completed[a] = count
+        elif metric == 'unlocked_index' and count:
+            unlocked[str(a)] = count
+        elif metric == 'points' and count:
+            points[str(a)] = count
+
+    report_projects = []
+    for index, project in enumerate(projects):
+        tasks = project_tasks[index] if index < len(project_tasks) else []
+        done = completed.get(index, 0)
+        report_projects.append({
+            'project_index': index,
+            'name': project.get('name'),
+            'completed': done,
+            'completion_rate': _rate(done, users),
+            'tasks': [{
+                'task_index': t,
+                'name': name,
+                'completed': tasks_done.get((index, t), 0),
+                'completion_rate': _rate(tasks_done.get((index, t), 0), users),
+            } for t, name in enumerate(tasks)],
+        })
+    return {'users': users, 'projects': report_projects, 'unlocked_index': unlocked, 'points': points}
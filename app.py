@@ -1,25 +1,58 @@
-from flask import Flask, request, jsonify, session, render_template, send_from_directory
+from flask import Flask, Response, g, request, jsonify, session, render_template, send_from_directory
 from datetime import datetime
 from flask_cors import CORS
+import click
 import os
 import json
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import create_engine, Column, Integer, String, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from typing import List
+import base64
+import hashlib
+import mimetypes
+import re
+import sys
+import threading
+import time
+import zlib
+from sqlalchemy import event, inspect, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, delete, func, or_, select, text, tuple_, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declarative_base, joinedload, sessionmaker, scoped_session, relationship
+from sqlalchemy.sql.functions import FunctionElement
+from analytics import CounterDeltas, build_report
+from chat_store import ChatStore
+from db_profiles import create_profiled_engine, pool_stats, sqlite_settings
+from events import create_broker
+from intents import IntentMatcher
+from leaderboard import Leaderboard
+from metrics import MetricsRegistry
+from passwords import HashingBusy, PasswordHasher
+from profiling import RequestProfiler
+from ratelimit import RateLimited, create_limiter
+from request_log import DEFAULT_REDACT_FIELDS, RequestLogger
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_SQLITE = f"sqlite:///{os.path.join(BASE_DIR, 'kevs.db')}"
 DATABASE_URL = os.environ.get('DATABASE_URL', DEFAULT_SQLITE)
 SECRET_KEY = os.environ.get('FLASK_SECRET_KEY', 'change-me-in-production')
+# Password hashing runs on a bounded pool (see passwords.py). The method is a
+# werkzeug method string carrying the cost, e.g. "scrypt:32768:8:1" or
+# "pbkdf2:sha256:600000"; hashes made with other parameters are upgraded at login.
+# Workers + queue request threads can wait on hashing at once: keep that below
+# the server's thread count so cheap requests always find a free thread.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '0')) or None
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', '4'))
+PASSWORD_HASH_MAX_WAIT = float(os.environ.get('PASSWORD_HASH_MAX_WAIT', '0.5'))
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_QUEUE,
+                                 max_wait=PASSWORD_HASH_MAX_WAIT)
+# comma-separated usernames allowed to use admin/debug endpoints
+ADMIN_USERNAMES = {u.strip() for u in os.environ.get('ADMIN_USERNAMES', '').split(',') if u.strip()}
 
 # Flask app
 # Serve top-level static files directly from the project root so requests
 # like `/style.css`, `/main.js` and `/images/...` are handled by Flask.
 app = Flask(__name__, static_folder='.', static_url_path='', template_folder='.')
-CORS(app, supports_credentials=True)
+# expose ETag so the SPA can revalidate cross-origin GETs with If-None-Match
+CORS(app, supports_credentials=True, expose_headers=['ETag'])
 app.secret_key = SECRET_KEY
 # Recommended production cookie settings (can be overridden by env)
 app.config.update(
@@ -28,15 +61,116 @@ app.config.update(
     SESSION_COOKIE_SECURE=(os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true')
 )
 
-# SQLAlchemy setup
-if DATABASE_URL.startswith('sqlite'):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
-SessionLocal = scoped_session(sessionmaker(bind=engine))
+# Serverless platforms (Vercel sets VERCEL=1) import the module per cold start
+# and never run __main__, so nothing below touches the database or the disk
+# until a request needs it, and the schema is checked on first database use
+SERVERLESS = os.environ.get('SERVERLESS', os.environ.get('VERCEL', '')).lower() in ('1', 'true')
+AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'true' if SERVERLESS else 'false').lower() == 'true'
+
+# SQLAlchemy setup: DB_PROFILE picks connection/pool tuning (see db_profiles.py)
+DB_PROFILE = os.environ.get('DB_PROFILE', 'web')
+_engine = None
+_engine_lock = threading.Lock()
+# expire_on_commit=False: handlers keep reading the row they just committed
+# without triggering a reload query
+_session_factory = sessionmaker(expire_on_commit=False)
+
+
+def get_engine():
+    """The engine, created on first use so importing the app stays cheap."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_profiled_engine(DATABASE_URL, DB_PROFILE)
+                event.listen(engine, 'before_cursor_execute', _query_started)
+                event.listen(engine, 'after_cursor_execute', _query_finished)
+                _session_factory.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def _new_session():
+    get_engine()
+    return _session_factory()
+
+
+SessionLocal = scoped_session(_new_session)
 Base = declarative_base()
 
 
+def __getattr__(name):
+    # `app.engine` for scripts and benchmarks; code in this module calls get_engine()
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Metrics, exposed at /metrics. Under several gunicorn workers set
+# METRICS_DIR to a directory shared by them so every scrape sees all workers.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+metrics = MetricsRegistry(shared_dir=METRICS_DIR)
+http_requests_total = metrics.counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+http_request_duration = metrics.histogram('http_request_duration_seconds', 'Time to produce a response, by route.', ('method', 'route'))
+http_requests_in_flight = metrics.gauge('http_requests_in_flight', 'Requests currently being handled, by route.', ('route',))
+db_queries_total = metrics.counter('db_queries_total', 'SQL statements executed, by statement type.', ('statement',))
+db_query_duration = metrics.histogram('db_query_duration_seconds', 'SQL statement execution time.', ('statement',), buckets=DB_BUCKETS)
+db_pool_connections = metrics.gauge('db_pool_connections', 'Connections in the SQLAlchemy pool, by state.', ('state',))
+rate_limited_total = metrics.counter('rate_limited_total', 'Requests rejected by the rate limiter, by route.', ('method', 'route'))
+chat_io_duration = metrics.histogram('chat_io_duration_seconds', 'Chat history file I/O time, by operation.', ('operation',), buckets=DB_BUCKETS)
+
+
+# the start time rides on the statement's execution context: a failed
+# statement never reaches after_cursor_execute and just takes its context
+# with it, instead of leaving a stale entry on a per-connection stack
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    db_queries_total.inc(kind)
+    db_query_duration.observe(time.perf_counter() - started, kind)
+
+
+class search_key(FunctionElement):
+    """``lower(column)`` in byte order, for case-insensitive prefix ranges.
+
+    PostgreSQL compares text with the database locale, which can sort
+    ``'ab-c'`` between ``'ab'`` and ``'abc'``; ``COLLATE "C"`` makes
+    ``key >= 'ab' AND key < 'ac'`` an exact prefix match there as it is on SQLite.
+    The search indexes are built on the same expression.
+    """
+    type = String()
+    name = 'search_key'
+    inherit_cache = True
+
+
+# SQLite's built-in lower() only folds ASCII letters
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def search_text(value: str) -> str:
+    """``value`` lowered by the same rule ``search_key`` uses on the current database."""
+    if get_engine().dialect.name == 'sqlite':
+        return value.translate(ASCII_LOWER)
+    return value.lower()
+
+
+@compiles(search_key)
+def _compile_search_key(element, compiler, **kw):
+    return f"lower({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(search_key, 'postgresql')
+def _compile_search_key_postgresql(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)}) COLLATE "C"'
+
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
@@ -45,10 +179,46 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     unlocked_index = Column(Integer, default=0, nullable=False)
-    # completed_projects and task_completion stored as JSON (list/dict)
-    completed_projects = Column(JSON, default=list)
-    task_completion = Column(JSON, default=dict)
     points = Column(Integer, default=0, nullable=False)
+    # bumped on every progress change; /api/user uses it as the ETag
+    version = Column(Integer, default=0, nullable=False, server_default='0')
+    # progress lives in the task_progress / project_completion tables so it can
+    # be updated with single-row upserts instead of rewriting a JSON blob
+    task_progress = relationship(
+        'TaskProgress', order_by='(TaskProgress.project_index, TaskProgress.task_index)',
+        cascade='all, delete-orphan'
+    )
+    project_completions = relationship(
+        'ProjectCompletion', order_by='(ProjectCompletion.completed_at, ProjectCompletion.project_index)',
+        cascade='all, delete-orphan'
+    )
+
+    @property
+    def completed_projects(self) -> list:
+        return [c.project_index for c in self.project_completions]
+
+    @property
+    def task_completion(self) -> dict:
+        """Per-project task flags in the legacy ``{"0": [true, false, ...]}`` shape."""
+        tc = {}
+        for row in self.task_progress:
+            if not (0 <= row.project_index < len(PROJECT_TASKS) and 0 <= row.task_index < len(PROJECT_TASKS[row.project_index])):
+                # stored before toggles were checked against the catalog
+                continue
+            flags = tc.setdefault(str(row.project_index), [])
+            while len(flags) <= row.task_index:
+                flags.append(False)
+            flags[row.task_index] = bool(row.done)
+        return tc
+
+    __table_args__ = (
+        # serves ORDER BY points DESC, id for the leaderboard and its keyset pages
+        Index('ix_users_points', points.desc(), id),
+        # prefix search and keyset pages of /api/admin/users
+        Index('ix_users_username_search', search_key(username), id),
+        Index('ix_users_email_search', search_key(email), id),
+        Index('ix_users_admission_search', search_key(admission), id),
+    )
 
     def to_dict(self):
         return {
@@ -63,134 +233,625 @@ class User(Base):
         }
 
 
-# Projects & tasks (static)
-PROJECTS = [
-    {
-        'id': 0,
-        'name': 'Web-Based Organizational Support System',
-        'description': 'This project helps organizations manage information, visualize dashboards, and respond to inquiries.',
-        'image': 'images/kevs4.jpeg',
-        'resources': [
-            {'label': 'Project Spec (PDF)', 'url': 'https://example.com/web-org-spec.pdf'},
-            {'label': 'Dashboard Patterns', 'url': 'https://uxdesign.cc/dashboard-patterns'},
-            {'label': 'Flask Tutorials', 'url': 'https://flask.palletsprojects.com/en/2.2.x/tutorial/'}
-        ]
-    },
-    {
-        'id': 1,
-        'name': 'Student Information Management System',
-        'description': 'Manages student records, academic performance, and attendance.',
-        'image': 'images/kevs2.jpeg',
-        'resources': [
-            {'label': 'Education Data Models', 'url': 'https://example.com/edu-data-models'},
-            {'label': 'Reporting Best Practices', 'url': 'https://www.smartsheet.com/reporting-best-practices'},
-            {'label': 'SQLite vs Postgres', 'url': 'https://www.postgresql.org/docs/current/datatype-json.html'}
-        ]
-    },
-    {
-        'id': 2,
-        'name': 'Smart Room Energy Monitoring System',
-        'description': 'Monitors and visualizes room energy usage using digital meters.',
-        'image': 'images/kevs1.jpeg',
-        'resources': [
-            {'label': 'IoT Energy Monitoring Guide', 'url': 'https://example.com/iot-energy-guide'},
-            {'label': 'Data Visualization Tips', 'url': 'https://observablehq.com/@d3/visualization'},
-            {'label': 'MQTT Intro', 'url': 'https://mqtt.org/documentation'}
-        ]
-    },
-    {
-        'id': 3,
-        'name': 'Library Management System',
-        'description': 'Manages book records, borrowing, returns, and users.',
-        'image': 'images/download.jpeg',
-        'resources': [
-            {'label': 'Library Systems Overview', 'url': 'https://example.com/library-systems'},
-            {'label': 'Cataloging Standards', 'url': 'https://www.oclc.org/en/worldcat.html'},
-            {'label': 'User Authentication Patterns', 'url': 'https://www.owasp.org/index.php/Authentication_Cheat_Sheet'}
-        ]
-    }
-]
-
-PROJECT_TASKS = [
-    ["Requirement Gathering", "Design", "Development", "Testing", "Deployment"],
-    ["Student Data Entry", "Grades Input", "Attendance Tracking", "Reporting"],
-    ["Meter Installation", "Data Monitoring", "Visualization", "Alerts Setup"],
-    ["Book Cataloging", "Borrowing Management", "Return Tracking", "User Accounts"]
-]
-
-# Directory to persist chat logs per user (simple file store for development)
-CHAT_DIR = os.path.join(BASE_DIR, 'data', 'chats')
-os.makedirs(CHAT_DIR, exist_ok=True)
-
+class TaskProgress(Base):
+    __tablename__ = 'task_progress'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    project_index = Column(Integer, primary_key=True)
+    task_index = Column(Integer, primary_key=True)
+    done = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (Index('ix_task_progress_task', 'project_index', 'task_index', 'done'),)
+
+
+class ProjectCompletion(Base):
+    __tablename__ = 'project_completion'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    project_index = Column(Integer, primary_key=True)
+    completed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+# the user's progress rows are joined into the same SELECT (one row per done
+# task x completed project, a few dozen at most), so a request that needs the
+# user and its progress costs one statement
+USER_LOAD_OPTIONS = (joinedload(User.task_progress), joinedload(User.project_completions))
+
+
+class AnalyticsCounter(Base):
+    """Aggregate progress counters behind /api/admin/analytics (see analytics.py)."""
+    __tablename__ = 'analytics_counters'
+    metric = Column(String(32), primary_key=True)
+    a = Column(Integer, primary_key=True)
+    b = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def dialect_insert(model):
+    dialect = get_engine().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"upsert not supported on {dialect}")
+    return insert(model)
+
+
+def upsert_stmt(model, index_elements: list, update_columns: tuple = (), where=None):
+    """INSERT ... ON CONFLICT for SQLite and PostgreSQL.
+
+    Execute it on ``db.connection()`` with one parameter dict or a list of
+    them (executemany). Conflicting rows get ``update_columns`` overwritten
+    from the new values, if they match ``where``; with no update columns the
+    insert is skipped (``rowcount`` is 0 when the row already existed).
+    ``index_elements=None`` skips rows that conflict on any unique constraint.
+    """
+    stmt = dialect_insert(model)
+    if update_columns:
+        return stmt.on_conflict_do_update(index_elements=index_elements, set_={c: stmt.excluded[c] for c in update_columns},
+                                          where=where)
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
+def apply_counter_deltas(db, deltas: CounterDeltas):
+    """Add ``deltas`` to analytics_counters, in the caller's transaction."""
+    rows = deltas.rows()
+    if not rows:
+        return
+    stmt = dialect_insert(AnalyticsCounter)
+    db.connection().execute(
+        stmt.on_conflict_do_update(index_elements=['metric', 'a', 'b'],
+                                   set_={'count': AnalyticsCounter.count + stmt.excluded.count}),
+        rows
+    )
+
+
+def rebuild_counters(db) -> int:
+    """Recompute analytics_counters from the progress tables; returns the row count."""
+    if get_engine().dialect.name == 'postgresql':
+        # progress writers wait for the rebuild, then apply their deltas on top of it
+        db.execute(text('LOCK TABLE analytics_counters IN EXCLUSIVE MODE'))
+    db.execute(delete(AnalyticsCounter))
+    deltas = CounterDeltas()
+    deltas.add('users', n=db.scalar(select(func.count()).select_from(User)))
+    for p, t, n in db.execute(select(TaskProgress.project_index, TaskProgress.task_index, func.count())
+                              .where(TaskProgress.done.is_(True))
+                              .group_by(TaskProgress.project_index, TaskProgress.task_index)):
+        deltas.add('task_done', p, t, n)
+    for p, n in db.execute(select(ProjectCompletion.project_index, func.count()).group_by(ProjectCompletion.project_index)):
+        deltas.add('project_completed', p, n=n)
+    for index, n in db.execute(select(User.unlocked_index, func.count()).group_by(User.unlocked_index)):
+        deltas.add('unlocked_index', index, n=n)
+    for points, n in db.execute(select(User.points, func.count()).group_by(User.points)):
+        deltas.add('points', points, n=n)
+    apply_counter_deltas(db, deltas)
+    return len(deltas.rows())
+
+
+def bump_version(db, user_id: int):
+    db.execute(update(User).where(User.id == user_id).values(version=User.version + 1))
+
+
+def set_task_flags(db, user_id: int, flags: list, deltas: CounterDeltas):
+    """Set ``(project_index, task_index, done)`` tuples for one user.
+
+    Only rows whose flag actually changes are written, and RETURNING reports
+    exactly those, so the ``task_done`` counters in ``deltas`` stay exact
+    under concurrent toggles. A missing row means "not done".
+    """
+    conn = db.connection()
+    checked = [{'user_id': user_id, 'project_index': p, 'task_index': t, 'done': True} for p, t, done in flags if done]
+    unchecked = [(p, t) for p, t, done in flags if not done]
+    if checked:
+        stmt = upsert_stmt(TaskProgress, ['user_id', 'project_index', 'task_index'], ('done',),
+                           where=TaskProgress.done.is_(False))
+        for p, t in conn.execute(stmt.returning(TaskProgress.project_index, TaskProgress.task_index), checked):
+            deltas.add('task_done', p, t)
+    if unchecked:
+        stmt = update(TaskProgress).where(
+            TaskProgress.user_id == user_id, TaskProgress.done.is_(True),
+            tuple_(TaskProgress.project_index, TaskProgress.task_index).in_(unchecked)
+        ).values(done=False)
+        for p, t in conn.execute(stmt.returning(TaskProgress.project_index, TaskProgress.task_index)):
+            deltas.add('task_done', p, t, n=-1)
+
+
+def with_task_flags(tc: dict, flags: list) -> dict:
+    """Apply ``(project_index, task_index, done)`` tuples to a ``task_completion`` dict.
+
+    Mirrors ``set_task_flags``: unchecking a task that has no row adds nothing.
+    """
+    for p, t, done in flags:
+        row = tc.get(str(p))
+        if row is None or t >= len(row):
+            if not done:
+                continue
+            row = tc.setdefault(str(p), [])
+            row.extend([False] * (t + 1 - len(row)))
+        row[t] = done
+    return tc
+
+
+def move_user(db, user_id: int, expected, change) -> tuple:
+    """Set a user's ``(unlocked_index, points)`` to ``change(unlocked_index, points)``.
+
+    ``expected`` are the values loaded with the user: the UPDATE only matches
+    while the row still holds them, so the usual case costs one statement.
+    If another request changed the row in between (or ``expected`` is None),
+    the row is read under a lock and the change applied to what it holds.
+    Returns ``(old, new)`` so callers can move the analytics counters exactly.
+    """
+    if expected is not None:
+        new = change(*expected)
+        matched = db.execute(
+            update(User).where(User.id == user_id, User.unlocked_index == expected[0], User.points == expected[1])
+            .values(unlocked_index=new[0], points=new[1], version=User.version + 1)
+        ).rowcount
+        if matched:
+            return tuple(expected), new
+    # the row lock (PostgreSQL) or the write lock already held by this
+    # transaction (SQLite) keeps these values current until commit
+    old = tuple(db.execute(
+        select(User.unlocked_index, User.points).where(User.id == user_id).with_for_update()
+    ).one())
+    new = change(*old)
+    db.execute(update(User).where(User.id == user_id).values(unlocked_index=new[0], points=new[1], version=User.version + 1))
+    return old, new
+
+
+def mark_project_complete(db, user_id: int, project_index: int, deltas: CounterDeltas, expected=None):
+    """Record a completion and award its points.
+
+    ``expected`` is the user's current ``(unlocked_index, points)`` as far as
+    the caller knows (see ``move_user``). Returns the new values, or None if
+    the project was already completed.
+    """
+    # stamped here rather than by the server's second-resolution clock, so
+    # completions keep their order even within one second or transaction
+    inserted = db.connection().execute(
+        upsert_stmt(ProjectCompletion, ['user_id', 'project_index']),
+        {'user_id': user_id, 'project_index': project_index, 'completed_at': datetime.utcnow()}
+    ).rowcount
+    if not inserted:
+        return None
 
-def chat_history_path(username: str) -> str:
-    safe = ''.join(c for c in username if c.isalnum() or c in ('_', '-')).lower()
-    return os.path.join(CHAT_DIR, f"{safe}.json")
+    def complete(unlocked, points):
+        return (unlocked + 1 if unlocked == project_index and unlocked < len(PROJECTS) - 1 else unlocked), points + 50
+
+    old, new = move_user(db, user_id, expected, complete)
+    deltas.add('project_completed', project_index)
+    deltas.user_moved(*old, *new)
+    return new
+
+
+# Projects & tasks (static): edit data/projects.json
+CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(BASE_DIR, 'data', 'projects.json'))
+
+
+def load_catalog(path: str) -> tuple:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['projects'], data['project_tasks']
+
+
+PROJECTS, PROJECT_TASKS = load_catalog(CATALOG_PATH)
+
+
+def project_index_arg(value) -> int:
+    """``value`` as the index of a catalog project; raises ValueError otherwise."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    index = int(value)
+    if not 0 <= index < len(PROJECTS):
+        raise ValueError(value)
+    return index
+
+
+def task_index_args(project_value, task_value) -> tuple:
+    """``(project_index, task_index)`` of a catalog task; raises ValueError otherwise."""
+    project_index = project_index_arg(project_value)
+    if isinstance(task_value, bool) or not isinstance(task_value, (int, str)):
+        raise ValueError(task_value)
+    task_index = int(task_value)
+    if not 0 <= task_index < len(PROJECT_TASKS[project_index]):
+        raise ValueError(task_value)
+    return project_index, task_index
+
+# Static assets: `source` serves the files in the project root as-is; `dist`
+# serves the fingerprinted, precompressed output of build_assets.py
+ASSET_MODE = os.environ.get('ASSET_MODE', 'source')
+DIST_DIR = os.path.join(BASE_DIR, 'dist')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def load_asset_manifest() -> dict:
+    if ASSET_MODE != 'dist':
+        return {}
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def catalog_projects(manifest: dict) -> list:
+    """PROJECTS with image URLs pointing at built assets (when a manifest is loaded)."""
+    if not manifest:
+        return PROJECTS
+    projects = []
+    for p in PROJECTS:
+        p = dict(p)
+        image = p.get('image')
+        if image in manifest.get('assets', {}):
+            p['image'] = manifest.get('originals', {}).get(image, manifest['assets'][image])
+        if image in manifest.get('images', {}):
+            # srcset strings per format for <picture>/<source> on the project cards
+            p['image_sources'] = manifest['images'][image]
+        projects.append(p)
+    return projects
+
+
+def fingerprinted_assets(manifest: dict) -> frozenset:
+    """Paths under ``/assets/`` of every content-hashed file the manifest points at."""
+    urls = list(manifest.get('assets', {}).values()) + list(manifest.get('originals', {}).values())
+    for sources in manifest.get('images', {}).values():
+        for srcset in sources.values():
+            urls.extend(candidate.split()[0] for candidate in srcset.split(','))
+    return frozenset(url[len('/assets/'):] for url in urls if url.startswith('/assets/'))
+
+
+asset_manifest = load_asset_manifest()
+# only these names change with their content; index.html and manifest.json
+# in dist/ keep their names and are not served under /assets/
+ASSET_FILES = fingerprinted_assets(asset_manifest)
+
+# The catalog never changes at runtime: encode it once and derive a strong ETag
+PROJECTS_JSON = json.dumps({'projects': catalog_projects(asset_manifest), 'project_tasks': PROJECT_TASKS}, separators=(',', ':')).encode('utf-8')
+PROJECTS_ETAG = hashlib.sha256(PROJECTS_JSON).hexdigest()[:32]
+PROJECTS_CACHE_CONTROL = 'public, max-age=300'
+# per-user responses: browsers may store them but must revalidate every time
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+# Directory to persist chat logs per user (append-only segmented JSONL store)
+CHAT_DIR = os.environ.get('CHAT_DIR', os.path.join(BASE_DIR, 'data', 'chats'))
+CHAT_SEGMENT_SIZE = int(os.environ.get('CHAT_SEGMENT_SIZE', '500'))
+CHAT_MAX_MESSAGES = int(os.environ.get('CHAT_MAX_MESSAGES', '0'))
+CHAT_CACHE_BYTES = int(os.environ.get('CHAT_CACHE_BYTES', str(32 * 1024 * 1024)))
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 500
+chat_store = ChatStore(CHAT_DIR, segment_size=CHAT_SEGMENT_SIZE, max_messages=CHAT_MAX_MESSAGES,
+                       cache_bytes=CHAT_CACHE_BYTES)
+
+# Server-Sent Events: `memory` for a single process, `sqlite` to share events
+# between gunicorn workers on the same host
+EVENT_BACKEND = os.environ.get('EVENT_BACKEND', 'memory')
+EVENT_DB_PATH = os.environ.get('EVENT_DB_PATH', os.path.join(BASE_DIR, 'data', 'events.db'))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+event_broker = create_broker(EVENT_BACKEND, EVENT_DB_PATH)
+
+
+# upper bound on operations accepted by /api/user/progress/batch
+BATCH_MAX_OPERATIONS = 200
+
+# Chat bot rules (see intents.py for the file format)
+INTENTS_PATH = os.environ.get('INTENTS_PATH', os.path.join(BASE_DIR, 'data', 'intents.json'))
+INTENT_CACHE_SIZE = int(os.environ.get('INTENT_CACHE_SIZE', '1024'))
+intent_matcher = IntentMatcher.from_file(INTENTS_PATH, cache_size=INTENT_CACHE_SIZE)
+
+# Request logging: JSON lines written by a background thread (see request_log.py)
+REQUEST_LOG_ENABLED = os.environ.get('REQUEST_LOG', 'true').lower() == 'true'
+REQUEST_LOG_PATH = os.environ.get('REQUEST_LOG_PATH')  # default: stdout
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '1.0'))
+REQUEST_LOG_CAPTURE_BODY = os.environ.get('REQUEST_LOG_CAPTURE_BODY', 'false').lower() == 'true'
+REQUEST_LOG_MAX_BODY = int(os.environ.get('REQUEST_LOG_MAX_BODY', '4096'))
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', '10000'))
+REQUEST_LOG_REDACT = os.environ.get('REQUEST_LOG_REDACT', ','.join(DEFAULT_REDACT_FIELDS)).split(',')
+request_logger = RequestLogger(
+    path=REQUEST_LOG_PATH,
+    queue_size=REQUEST_LOG_QUEUE_SIZE,
+    sample_rate=REQUEST_LOG_SAMPLE_RATE,
+    capture_body=REQUEST_LOG_CAPTURE_BODY,
+    max_body_bytes=REQUEST_LOG_MAX_BODY,
+    redact_fields=REQUEST_LOG_REDACT,
+)
 
+# Profiling: a request carrying a valid signed X-Profile header (see
+# `flask profile-token`), or an admin's `?_profile=1`, is run under cProfile
+# and saved to PROFILE_DIR. PROFILE_SAMPLE_EVERY=N also profiles 1 in N
+# requests for the rolling summary at /debug/profile.
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'data', 'profiles'))
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET') or None
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_WINDOW = int(os.environ.get('PROFILE_WINDOW', '100'))
+profiler = RequestProfiler(PROFILE_DIR, secret=PROFILE_SECRET, sample_every=PROFILE_SAMPLE_EVERY, window=PROFILE_WINDOW)
+
+# Rate limiting (see ratelimit.py for the policy syntax). A class often shares
+# one IP (NAT, or a proxy without TRUSTED_PROXY_HOPS), so login is limited per
+# username and IP, and the per-IP limits leave room for a room full of students.
+DEFAULT_RATE_LIMITS = (
+    'POST /api/login: 10/min per username burst 5;'
+    'POST /api/login: 300/min per ip burst 100;'
+    'POST /api/register: 120/min per ip burst 60;'
+    'POST /api/chat: 30/min per user burst 10;'
+    'POST /api/user/progress/task: 10/s per user burst 30;'
+    'POST /api/user/progress/batch: 2/s per user burst 10'
+)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT', 'true').lower() == 'true'
+RATE_LIMITS = os.environ.get('RATE_LIMITS', DEFAULT_RATE_LIMITS)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_DB_PATH = os.environ.get('RATE_LIMIT_DB_PATH', os.path.join(BASE_DIR, 'data', 'ratelimit.db'))
+rate_limiter = create_limiter(RATE_LIMIT_BACKEND, RATE_LIMITS, RATE_LIMIT_DB_PATH)
 
-def load_chat_history(username: str) -> List[dict]:
-    path = chat_history_path(username)
-    if not os.path.exists(path):
-        return []
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+# Number of reverse proxies in front of the app that append X-Forwarded-For /
+# X-Forwarded-Proto. 0 (default) trusts no forwarded headers: a client could
+# set them to anything, so only enable this when a proxy always sets them.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+if TRUSTED_PROXY_HOPS:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 
 
-def save_chat_history(username: str, history: List[dict]):
-    path = chat_history_path(username)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
 
 
 def bot_reply(user_name: str, message: str) -> str:
-    """Simple rule-based bot for development. Returns a short reply."""
-    m = (message or '').strip().lower()
-    # Quick rules
-    if not m:
-        return "Could you rephrase that? I didn't catch it."
-    if 'project' in m or 'projects' in m:
-        return "You can open Projects to see available work. Click a chart or 'Open Project' to view tasks and progress."
-    if 'task' in m or 'tasks' in m:
-        return "Tasks are listed on the project dashboard. Check/uncheck them to track progress — completing all tasks marks the project complete."
-    if 'points' in m or 'score' in m:
-        return "Points are awarded when you complete a project (50 points). Check your points on the Projects page."
-    if 'hello' in m or 'hi' in m:
-        return f"Hi {user_name or 'there'}! How can I help with your projects today?"
-    if 'help' in m:
-        return "Ask me about projects, tasks, or how to use the dashboard — I'll do my best to help."
-    # default: echo-like helpful reply
-    return "Thanks for your question — I registered it. Try asking about 'projects', 'tasks', or 'points'."
+    """Rule-based bot reply using the intents in ``INTENTS_PATH``."""
+    return intent_matcher.reply(message, name=user_name or 'there')
+
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+ALEMBIC_DIR = os.path.join(BASE_DIR, 'alembic')
+MIGRATION_REVISION_RE = re.compile(r"^(down_revision|revision)\s*=\s*(?:'([^']*)'|None)", re.MULTILINE)
+
+
+def alembic_head() -> str:
+    """The newest migration in ``alembic/versions``.
+
+    Read from the scripts' ``revision``/``down_revision`` lines rather than
+    through alembic's ScriptDirectory, whose import would add a few hundred
+    milliseconds to every cold start.
+    """
+    revisions, parents = set(), set()
+    versions = os.path.join(ALEMBIC_DIR, 'versions')
+    for name in os.listdir(versions):
+        if not name.endswith('.py'):
+            continue
+        with open(os.path.join(versions, name), 'r', encoding='utf-8') as f:
+            for key, value in MIGRATION_REVISION_RE.findall(f.read()):
+                if value:
+                    (revisions if key == 'revision' else parents).add(value)
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"expected one Alembic head in {versions}, found {sorted(heads)}")
+    return heads.pop()
+
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is not at the Alembic head this code was written for."""
+
+
+def ensure_schema():
+    """Check once per process that the database is at the newest Alembic revision.
+
+    An empty database gets the current schema and is stamped at head, so
+    later ``alembic upgrade`` runs pick up from there. A database at an
+    older revision (or with tables Alembic does not know about) is never
+    touched: every request fails with ``SchemaOutOfDate`` until it is
+    migrated with ``alembic upgrade head``.
+    """
+    global _schema_checked
+    if _schema_checked:
+        return
+    with _schema_lock:
+        if _schema_checked:
+            return
+        head = alembic_head()
+        created = False
+        with get_engine().begin() as conn:
+            tables = inspect(conn).get_table_names()
+            current = None
+            if 'alembic_version' in tables:
+                current = conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+            if current is None and not tables:
+                from alembic.runtime.migration import MigrationContext
+                from alembic.script import ScriptDirectory
+
+                Base.metadata.create_all(bind=conn)
+                MigrationContext.configure(conn).stamp(ScriptDirectory(ALEMBIC_DIR), head)
+                created = True
+            elif current != head:
+                raise SchemaOutOfDate(f"database schema is at {current or 'no Alembic revision'}, "
+                                      f"this code needs {head}: run `alembic upgrade head`")
+        if created:
+            seed_db(demo_user=os.environ.get('FLASK_ENV', '') == 'development')
+        _schema_checked = True
+
+
+def ready_engine():
+    """``get_engine()``, after the one-time schema check when AUTO_INIT_DB is on."""
+    if AUTO_INIT_DB:
+        ensure_schema()
+    return get_engine()
 
 
 def init_db():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-    # Ensure demo user exists
+    """Create missing tables and the demo user (local development and benchmarks)."""
+    Base.metadata.create_all(bind=get_engine())
+    seed_db(demo_user=True)
+
+
+def seed_db(demo_user: bool):
+    """Create the demo/demo123 account if asked to, and the analytics counters if missing."""
     db = SessionLocal()
     try:
-        demo = db.query(User).filter_by(username='demo').first()
-        if not demo:
-            demo_user = User(
+        if demo_user and not db.query(User).filter_by(username='demo').first():
+            db.add(User(
                 username='demo',
                 admission='123',
                 email='demo@example.com',
-                password_hash=generate_password_hash('demo123'),
+                password_hash=password_hasher.hash_sync('demo123'),
                 points=0
-            )
-            db.add(demo_user)
+            ))
             db.commit()
+        if db.get(AnalyticsCounter, ('users', 0, 0)) is None:
+            # first start with this table (or before any user existed)
+            rebuild_counters(db)
+            db.commit()
+    finally:
+        db.close()
+
+
+@app.cli.command('profile-token')
+@click.option('--ttl', default=3600, show_default=True, help='Seconds the token stays valid.')
+def profile_token_command(ttl):
+    """Print an X-Profile header value that profiles any request it is sent with."""
+    try:
+        print(profiler.make_token(ttl))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+@app.cli.command('import-users')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Hashing processes.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per transaction.')
+@click.option('--credentials-out', help='Generate passwords for rows without one and write them to this CSV.')
+def import_users_command(path, fmt, workers, batch_size, credentials_out):
+    """Create users from a CSV or JSONL file (PATH, or - for stdin).
+
+    Columns: username, email, admission, and password or password_hash.
+    Existing usernames/emails are skipped.
+    """
+    import bulk_users
+
+    init_db()
+    fmt = bulk_users.detect_format(path, fmt)
+    started = time.perf_counter()
+
+    def report(stats):
+        rate = stats['read'] / max(time.perf_counter() - started, 1e-9)
+        click.echo(f"read {stats['read']}  inserted {stats['inserted']}  duplicates {stats['duplicates']}  "
+                   f"invalid {stats['invalid']}  ({rate:.0f} rows/s)", err=True)
+
+    credentials = click.open_file(credentials_out, 'w', encoding='utf-8') if credentials_out else None
+    db = SessionLocal()
+    try:
+        with click.open_file(path, 'r', encoding='utf-8') as stream:
+            stats = bulk_users.import_users(
+                db, bulk_users.read_rows(stream, fmt), PASSWORD_HASH_METHOD, workers=workers,
+                batch_size=batch_size, credentials=credentials, progress=report,
+            )
+    finally:
+        db.close()
+        if credentials is not None:
+            credentials.close()
+    for error in stats['errors']:
+        click.echo(error, err=True)
+    click.echo(f"{stats['inserted']} users imported, {stats['duplicates']} duplicates skipped, {stats['invalid']} invalid rows")
+
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Recompute the /api/admin/analytics counters from the progress tables."""
+    db = SessionLocal()
+    try:
+        rows = rebuild_counters(db)
+        db.commit()
+    finally:
+        db.close()
+    click.echo(f"rebuilt {rows} analytics counters")
+
+
+@app.cli.command('export-users')
+@click.option('--output', '-o', default='-', show_default=True, help='File to write, or - for stdout.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Users fetched per round trip.')
+@click.option('--include-hashes', is_flag=True, help='Include password hashes (for moving users between databases).')
+def export_users_command(output, fmt, batch_size, include_hashes):
+    """Stream every user with their progress as JSONL or CSV."""
+    import bulk_users
+
+    fmt = bulk_users.detect_format(output, fmt) if output != '-' else (fmt or 'jsonl')
+    db = SessionLocal()
+    try:
+        with click.open_file(output, 'w', encoding='utf-8') as out:
+            count = bulk_users.write_records(
+                bulk_users.iter_user_records(db, batch_size=batch_size, include_hashes=include_hashes),
+                out, fmt, include_hashes=include_hashes,
+                progress=lambda n: click.echo(f"exported {n} users", err=True),
+            )
     finally:
         db.close()
+    click.echo(f"{count} users exported", err=True)
+
+
+@app.cli.command('migrate-chats')
+def migrate_chats_command():
+    """Convert legacy data/chats/<user>.json files to the segmented store."""
+    migrated = failed = 0
+    for username in chat_store.legacy_usernames():
+        try:
+            count = chat_store.migrate_legacy(username)
+        except OSError as e:
+            click.echo(f"failed to migrate {username}: {e}", err=True)
+            failed += 1
+            continue
+        click.echo(f"migrated {username}: {count} messages")
+        migrated += 1
+    click.echo(f"{migrated} chat histories migrated")
+    if failed:
+        raise click.ClickException(f"{failed} chat histories could not be migrated")
+
+
+@app.cli.command('compact-chats')
+def compact_chats_command():
+    """Compact every user's sealed chat segments (drops torn lines, applies retention)."""
+    total = failed = 0
+    for name in sorted(os.listdir(CHAT_DIR)) if os.path.isdir(CHAT_DIR) else ():
+        if os.path.isdir(os.path.join(CHAT_DIR, name)):
+            try:
+                chat_store.compact(name)
+            except OSError as e:
+                click.echo(f"failed to compact {name}: {e}", err=True)
+                failed += 1
+                continue
+            total += 1
+    click.echo(f"{total} chat histories compacted")
+    if failed:
+        raise click.ClickException(f"{failed} chat histories could not be compacted")
+
+
+def send_precompressed(directory: str, filename: str, cache_control: str):
+    """Send ``filename``, or its ``.br``/``.gz`` sibling if the client accepts it."""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    resp = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            resp = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+            resp.headers['Content-Encoding'] = encoding
+            break
+    if resp is None:
+        resp = send_from_directory(directory, filename, mimetype=mimetype)
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = cache_control
+    return resp
 
 
 @app.route('/')
 def index():
+    if ASSET_MODE == 'dist':
+        # the entry page keeps a stable name, so it is always revalidated
+        return send_precompressed(DIST_DIR, 'index.html', 'no-cache')
     return render_template('index.html')
 
 
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Fingerprinted build output: the name changes with the content, so cache forever."""
+    if filename not in ASSET_FILES:
+        return jsonify({'success': False, 'message': 'Not Found'}), 404
+    return send_precompressed(DIST_DIR, filename, IMMUTABLE_CACHE_CONTROL)
+
+
 @app.route('/debug/ping', methods=['GET'])
 def debug_ping():
     """Lightweight debug endpoint to confirm which server handled the request."""
@@ -203,6 +864,51 @@ def debug_ping():
     })
 
 
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Top functions by cumulative time over the recently profiled requests."""
+    if not (profiler.verify_token(request.headers.get('X-Profile')) or is_admin(get_current_user())):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    try:
+        limit = min(max(int(request.args.get('limit', 30)), 1), 200)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'sample_every': profiler.sample_every,
+        'profiled_requests': profiler.profiled,
+        'window': profiler.window_size(),
+        'functions': profiler.summary(limit),
+    })
+
+
+@app.route('/debug/db', methods=['GET'])
+def debug_db():
+    """Active DB_PROFILE, pool counters and (SQLite) the effective PRAGMAs; admins only."""
+    if not is_admin(get_current_user()):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'dialect': get_engine().dialect.name,
+        'profile': DB_PROFILE,
+        'pool': pool_stats(get_engine()),
+        'sqlite': sqlite_settings(get_engine()),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of the metrics above (all workers with METRICS_DIR)."""
+    stats = pool_stats(get_engine()) if _engine is not None else {}
+    for state in ('checkedout', 'checkedin', 'overflow'):
+        if state in stats:
+            db_pool_connections.set(state, value=stats[state])
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
+
+
 # Fallback routes for top-level static assets. These are explicit fallbacks so the
 # SPA can fetch `style.css`, `main.js` and `favicon.ico` even if a proxy or other
 # server is intercepting requests. The app is already configured with
@@ -235,18 +941,123 @@ def serve_images(filename):
     return send_from_directory(images_dir, filename)
 
 
+def request_route() -> str:
+    # the URL rule, not the path, so ids in URLs don't create new series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
 @app.before_request
-def log_request_info():
-    try:
-        data = request.get_data(as_text=True)
-    except Exception:
-        data = '<unable to read body>'
-    print(f"[REQUEST] {request.method} {request.path} body={data}")
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start()
+    http_requests_in_flight.inc(request_route())
+    g.metrics_in_flight = True
+
+
+@app.before_request
+def enforce_rate_limits():
+    # only the session cookie (and for login the body) is consulted, so
+    # rejected requests never touch the database
+    if not RATE_LIMIT_ENABLED:
+        return
+    route = request_route()
+    username = None
+    if rate_limiter.uses_username(request.method, route):
+        data = request.get_json(silent=True)
+        username = str(data.get('username') or '').strip().lower() if isinstance(data, dict) else ''
+    rate_limiter.check(request.method, route, session.get('user_id'), request.remote_addr, username)
+
+
+@app.after_request
+def record_request_metrics(resp):
+    route = request_route()
+    http_requests_total.inc(request.method, route, resp.status_code)
+    if 'request_started' in g:
+        http_request_duration.observe(time.perf_counter() - g.request_started, request.method, route)
+    return resp
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # teardown also runs when a handler raised, so the gauge never leaks
+    if g.pop('metrics_in_flight', False):
+        http_requests_in_flight.dec(request_route())
+
+
+@app.after_request
+def log_request(resp):
+    """Queue one structured record per request; never reads or blocks on the body."""
+    if not REQUEST_LOG_ENABLED or not (resp.status_code >= 500 or request_logger.sampled()):
+        return resp
+    started = g.get('request_started')
+    record = {
+        'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+        'method': request.method,
+        'path': request.path,
+        'status': resp.status_code,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 3) if started is not None else None,
+        'request_bytes': request.content_length or 0,
+        'response_bytes': resp.content_length,
+        'user_id': session.get('user_id'),
+    }
+    if (request_logger.capture_body and request.is_json
+            and 0 < (request.content_length or 0) <= request_logger.max_body_bytes):
+        # get_json caches its result, so this reuses the handler's parse
+        record['body'] = request_logger.redact(request.get_json(silent=True))
+    request_logger.log(record)
+    return resp
+
+
+@app.before_request
+def start_profile():
+    explicit = profiler.verify_token(request.headers.get('X-Profile')) or (
+        request.args.get('_profile') == '1' and is_admin(get_current_user()))
+    if explicit or profiler.sampled():
+        g.profile = profiler.start(explicit)
+
+
+@app.after_request
+def finish_profile(resp):
+    # registered last so it runs first: the profile covers only the view
+    active = g.pop('profile', None)
+    if active is not None:
+        name = profiler.stop(active, f"{request.method} {request_route()}")
+        if name:
+            resp.headers['X-Profile-File'] = name
+    return resp
+
+
+@app.teardown_request
+def abort_profile(exc):
+    # the view raised before after_request could stop the profiler
+    active = g.pop('profile', None)
+    if active is not None:
+        profiler.stop(active, f"{request.method} {request_route()}")
+
+
+def not_modified(etag: str, cache_control: str):
+    """Return a 304 response if the client already holds ``etag``, else ``None``."""
+    # If-None-Match uses the weak comparison (RFC 9110), so W/"..." still matches
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        return with_etag(resp, etag, cache_control)
+    return None
+
+
+def with_etag(resp, etag: str, cache_control: str):
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = cache_control
+    if cache_control.startswith('private'):
+        resp.vary.add('Cookie')
+    return resp
 
 
 @app.route('/api/projects', methods=['GET'])
 def api_projects():
-    return jsonify({'projects': PROJECTS, 'project_tasks': PROJECT_TASKS})
+    cached = not_modified(PROJECTS_ETAG, PROJECTS_CACHE_CONTROL)
+    if cached is not None:
+        return cached
+    return with_etag(Response(PROJECTS_JSON, mimetype='application/json'), PROJECTS_ETAG, PROJECTS_CACHE_CONTROL)
 
 
 
@@ -261,27 +1072,26 @@ def api_register():
     if not username or not email or not password:
         return jsonify({'success': False, 'message': 'Missing fields'}), 400
 
-    db = SessionLocal()
-    try:
-        exists = db.query(User).filter((User.username == username) | (User.email == email)).first()
-        if exists:
-            return jsonify({'success': False, 'message': 'Username or email already exists'}), 400
-
-        user = User(
-            username=username,
-            admission=admission,
-            email=email,
-            password_hash=generate_password_hash(password),
-            unlocked_index=0,
-            completed_projects=[],
-            task_completion={},
-            points=0
-        )
-        db.add(user)
-        db.commit()
-        return jsonify({'success': True, 'message': 'Account created'})
-    finally:
-        db.close()
+    db = get_db()
+    exists = db.query(User).filter((User.username == username) | (User.email == email)).first()
+    if exists:
+        return jsonify({'success': False, 'message': 'Username or email already exists'}), 400
+
+    user = User(
+        username=username,
+        admission=admission,
+        email=email,
+        password_hash=password_hasher.hash(password),
+        unlocked_index=0,
+        points=0
+    )
+    db.add(user)
+    deltas = CounterDeltas()
+    deltas.user_added()
+    apply_counter_deltas(db, deltas)
+    db.commit()
+    leaderboard.record_points(user.id, user.username, None, 0)
+    return jsonify({'success': True, 'message': 'Account created'})
 
 
 @app.errorhandler(405)
@@ -290,6 +1100,22 @@ def method_not_allowed(e):
     return jsonify({'success': False, 'message': 'Method Not Allowed', 'detail': str(e)}), 405
 
 
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    # shed login/register bursts early instead of queueing them behind each other
+    resp = jsonify({'success': False, 'message': 'Server busy, please retry shortly'})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 503
+
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    rate_limited_total.inc(request.method, request_route())
+    resp = jsonify({'success': False, 'message': 'Too many requests, please slow down'})
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp, 429
+
+
 @app.errorhandler(500)
 def server_error(e):
     # Generic JSON error handler for server errors during development; do not expose in production
@@ -305,33 +1131,70 @@ def api_login():
     if not username or not password:
         return jsonify({'success': False, 'message': 'Missing fields'}), 400
 
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter_by(username=username).first()
-        if not user or not check_password_hash(user.password_hash, password):
-            return jsonify({'success': False, 'message': 'Invalid credentials'}), 400
-        session['username'] = username
-        return jsonify({'success': True, 'username': username})
-    finally:
-        db.close()
+    db = get_db()
+    user = db.query(User).filter_by(username=username).first()
+    if not user or not password_hasher.verify(user.password_hash, password):
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 400
+    if password_hasher.needs_rehash(user.password_hash):
+        # the password is known only now: upgrade hashes made with older parameters
+        try:
+            user.password_hash = password_hasher.hash(password)
+            db.commit()
+        except HashingBusy:
+            pass
+    # the id is what later requests resolve by (primary-key lookup)
+    session['user_id'] = user.id
+    session['username'] = username
+    return jsonify({'success': True, 'username': username})
 
 
 @app.route('/api/logout', methods=['POST'])
 def api_logout():
+    session.pop('user_id', None)
     session.pop('username', None)
     return jsonify({'success': True})
 
 
+def get_db():
+    """Return the database session for the current request, opened on first use.
+
+    Every handler (and ``get_current_user``) shares this session, so the
+    current user's row is loaded once and mutated in place.
+    """
+    if 'db' not in g:
+        ready_engine()
+        g.db = SessionLocal()
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc):
+    db = g.pop('db', None)
+    if db is not None:
+        if exc is not None:
+            db.rollback()
+        SessionLocal.remove()
+
+
 def get_current_user():
-    username = session.get('username')
-    if not username:
-        return None
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter_by(username=username).first()
-        return user
-    finally:
-        db.close()
+    """Load the logged-in user once per request and cache it on ``flask.g``."""
+    if 'current_user' in g:
+        return g.current_user
+    user = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        user = get_db().get(User, user_id, options=USER_LOAD_OPTIONS)
+    elif session.get('username'):
+        # sessions created before user ids were stored in the cookie
+        user = get_db().query(User).options(*USER_LOAD_OPTIONS).filter_by(username=session['username']).first()
+        if user:
+            session['user_id'] = user.id
+    g.current_user = user
+    return user
+
+
+def is_admin(user) -> bool:
+    return user is not None and user.username in ADMIN_USERNAMES
 
 
 @app.route('/api/user', methods=['GET'])
@@ -339,22 +1202,104 @@ def api_user():
     user = get_current_user()
     if not user:
         return jsonify({'logged_in': False}), 200
-    return jsonify(dict(logged_in=True, **user.to_dict()))
+    # progress was loaded with the user, so both a 304 and a full answer cost one query
+    etag = f"user-{user.id}-v{user.version}"
+    cached = not_modified(etag, PRIVATE_CACHE_CONTROL)
+    if cached is not None:
+        return cached
+    return with_etag(jsonify(dict(logged_in=True, **user.to_dict())), etag, PRIVATE_CACHE_CONTROL)
+
+
+def parse_chat_query(args) -> tuple:
+    """Return ``(limit, since, before)`` from chat query args; raises ValueError."""
+    limit = min(max(int(args.get('limit', CHAT_PAGE_SIZE)), 1), CHAT_MAX_PAGE_SIZE)
+    since = args.get('since')
+    since = int(since) if since not in (None, '') else None
+    before = args.get('before')
+    before = int(before) if before not in (None, '') else None
+    return limit, since, before
+
+
+def chat_etag(user_id: int, username: str, query_string: bytes) -> str:
+    # the newest message id versions the whole conversation; the query string
+    # selects the page, so both go into the ETag
+    with chat_io_duration.time('last_id'):
+        last_id = chat_store.last_id(username)
+    return f"chat-{user_id}-{last_id}-{zlib.crc32(query_string):08x}"
+
+
+def chat_page(username: str, limit: int, since, before) -> dict:
+    """Body of a GET /api/chat response."""
+    if since is not None:
+        with chat_io_duration.time('since'):
+            history, has_more = chat_store.since(username, since, limit)
+        return {
+            'success': True,
+            'history': history,
+            'has_more': has_more,
+            'last_id': history[-1]['id'] if history else since
+        }
+    with chat_io_duration.time('tail'):
+        history, has_more = chat_store.tail(username, limit, before=before)
+    return {
+        'success': True,
+        'history': history,
+        'has_more': has_more,
+        'next_before': history[0]['id'] if has_more and history else None,
+        'last_id': history[-1]['id'] if history else 0
+    }
+
+
+def add_chat_message(user_id: int, username: str, text: str) -> tuple:
+    """Store a user message and the bot's reply, notify other tabs, return the response body and status."""
+    user_msg = {'who': 'user', 'text': text, 'time': datetime.utcnow().isoformat() + 'Z'}
+
+    # get bot reply (simple local rule-based reply)
+    reply_text = bot_reply(username, text)
+    bot_msg = {'who': 'bot', 'text': reply_text, 'time': datetime.utcnow().isoformat() + 'Z'}
+
+    # append both messages to the user's newest segment (no full-history rewrite)
+    try:
+        with chat_io_duration.time('append'):
+            user_msg, bot_msg = chat_store.append(username, [user_msg, bot_msg])
+    except Exception as e:
+        print('Failed to save chat history', e)
+        # nothing was stored, so there is nothing to push or merge by id
+        return {'success': False, 'message': 'Could not save message'}, 500
+
+    # push the pair to the user's other open tabs/devices
+    event_broker.publish(user_channel(user_id), 'chat', {'messages': [user_msg, bot_msg]})
+
+    # only the new pair is returned; clients merge it into their local copy by id
+    return {'success': True, 'reply': bot_msg, 'messages': [user_msg, bot_msg], 'last_id': bot_msg['id']}, 200
 
 
 @app.route('/api/chat', methods=['GET'])
 def api_chat_get():
-    """Return chat history for the current user."""
+    """Return chat messages for the current user.
+
+    Without parameters the newest page is returned. ``since=<id>`` returns only
+    messages after the client's last seen id; ``before=<id>`` (the previous
+    page's ``next_before``) pages backwards through older messages. ``limit`` caps the page size (default 50).
+    """
     user = get_current_user()
     if not user:
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
-    history = load_chat_history(user.username)
-    return jsonify({'success': True, 'history': history})
+    try:
+        limit, since, before = parse_chat_query(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit, since or before'}), 400
+
+    etag = chat_etag(user.id, user.username, request.query_string)
+    cached = not_modified(etag, PRIVATE_CACHE_CONTROL)
+    if cached is not None:
+        return cached
+    return with_etag(jsonify(chat_page(user.username, limit, since, before)), etag, PRIVATE_CACHE_CONTROL)
 
 
 @app.route('/api/chat', methods=['POST'])
 def api_chat_post():
-    """Append a user message and return bot reply (persisted to disk)."""
+    """Append a user message and return the new user+bot pair (persisted to disk)."""
     user = get_current_user()
     if not user:
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
@@ -363,25 +1308,283 @@ def api_chat_post():
     text = (data.get('message') or '').strip()
     if not text:
         return jsonify({'success': False, 'message': 'Empty message'}), 400
+    body, status = add_chat_message(user.id, user.username, text)
+    return jsonify(body), status
 
-    # load history, append user's message, produce bot reply and persist
-    history = load_chat_history(user.username)
-    user_msg = {'who': 'user', 'text': text, 'time': datetime.utcnow().isoformat() + 'Z'}
-    history.append(user_msg)
 
-    # get bot reply (simple local rule-based reply)
-    reply_text = bot_reply(user.username, text)
-    bot_msg = {'who': 'bot', 'text': reply_text, 'time': datetime.utcnow().isoformat() + 'Z'}
-    history.append(bot_msg)
+@app.route('/api/stream', methods=['GET'])
+def api_stream():
+    """Server-Sent Events stream of the current user's chat and progress changes.
+
+    Emits ``chat`` events (``{"messages": [...]}``) and ``progress`` events
+    carrying whichever of ``task_completion``, ``completed_projects``,
+    ``unlocked_index`` and ``points`` changed. A comment line is sent every
+    ``SSE_KEEPALIVE_SECONDS`` so proxies keep idle connections open.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+
+    sub = event_broker.subscribe(user_channel(user.id))
 
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                payload = sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+                yield payload if payload is not None else ': keepalive\n\n'
+        finally:
+            event_broker.unsubscribe(sub)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _load_leaderboard_top(limit: int):
+    with ready_engine().connect() as conn:
+        rows = conn.execute(
+            select(User.id, User.username, User.points).order_by(User.points.desc(), User.id).limit(limit)
+        )
+        return [tuple(r) for r in rows]
+
+
+def _load_points_histogram():
+    # the `points` analytics counters are this histogram, kept up to date by
+    # every progress write, so a reload reads a few counter rows, not users
+    with ready_engine().connect() as conn:
+        return dict(conn.execute(
+            select(AnalyticsCounter.a, AnalyticsCounter.count)
+            .where(AnalyticsCounter.metric == 'points', AnalyticsCounter.count > 0)
+        ).all())
+
+
+LEADERBOARD_CACHE_SIZE = int(os.environ.get('LEADERBOARD_CACHE_SIZE', '100'))
+LEADERBOARD_MAX_PAGE_SIZE = 100
+leaderboard = Leaderboard(
+    _load_leaderboard_top, _load_points_histogram,
+    size=LEADERBOARD_CACHE_SIZE, ttl=float(os.environ.get('LEADERBOARD_CACHE_TTL', '30'))
+)
+
+
+def _parse_leaderboard_cursor(cursor: str):
+    points, user_id = cursor.split('.', 1)
+    return int(points), int(user_id)
+
+
+@app.route('/api/leaderboard', methods=['GET'])
+def api_leaderboard():
+    """Users ordered by points (ties by signup order), keyset-paginated.
+
+    ``cursor`` is the ``next_cursor`` of the previous page. Pages that fall
+    inside the cached top list are served from memory; later pages use the
+    points index. Only logged-in users may list it.
+    """
+    if not get_current_user():
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
     try:
-        save_chat_history(user.username, history)
-    except Exception as e:
-        print('Failed to save chat history', e)
+        limit = min(max(int(request.args.get('limit', 20)), 1), LEADERBOARD_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        after = _parse_leaderboard_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit or cursor'}), 400
+
+    top = leaderboard.top()
+    if after is None:
+        start = 0
+    else:
+        start = next((i + 1 for i, e in enumerate(top) if (e[2], e[0]) == after), None)
+    if start is not None and (start + limit <= len(top) or len(top) < LEADERBOARD_CACHE_SIZE):
+        rows = top[start:start + limit + 1]
+    else:
+        query = select(User.id, User.username, User.points).order_by(User.points.desc(), User.id).limit(limit + 1)
+        if after is not None:
+            points, user_id = after
+            query = query.where(or_(User.points < points, (User.points == points) & (User.id > user_id)))
+        rows = get_db().execute(query).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    entries = []
+    for user_id, username, points in rows:
+        if entries and entries[-1]['points'] == points:
+            rank = entries[-1]['rank']
+        else:
+            rank = leaderboard.rank_of_points(points)
+        entries.append({'rank': rank, 'username': username, 'points': points})
+    next_cursor = f"{rows[-1][2]}.{rows[-1][0]}" if has_more and rows else None
+    return jsonify({'success': True, 'leaderboard': entries, 'next_cursor': next_cursor})
+
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+def api_leaderboard_me():
+    """Rank of the current user, answered from the cached points histogram."""
+    user = get_current_user()
+    if not user:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+    return jsonify({
+        'success': True,
+        'username': user.username,
+        'points': user.points,
+        'rank': leaderboard.rank_of_points(user.points),
+        'total_users': leaderboard.total_users()
+    })
+
+
+ADMIN_USERS_PAGE_SIZE = 20
+ADMIN_USERS_MAX_PAGE_SIZE = 100
+ADMIN_SEARCH_FIELDS = {'username': User.username, 'email': User.email, 'admission': User.admission}
+
+
+def search_fields(q: str) -> list:
+    """Fields to try for a ``q`` without ``field``, most likely first.
+
+    Emails contain '@'. Admission numbers have no fixed format ("123",
+    "A-100", "ADM/2024/7") but contain a digit, so such queries fall back to
+    the admission number (or from it to the username) when nothing matches.
+    """
+    if '@' in q:
+        return ['email']
+    if q[:1].isdigit():
+        return ['admission', 'username']
+    if any(c.isdigit() for c in q):
+        return ['username', 'admission']
+    return ['username']
+
+
+def prefix_upper_bound(prefix: str):
+    """Smallest string greater than every string starting with ``prefix``, or None if there is none."""
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
 
-    return jsonify({'success': True, 'reply': bot_msg, 'history': history})
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
 
 
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError(cursor)
+    if not isinstance(values, list):
+        raise ValueError(cursor)
+    return values
+
+
+def admin_users_stmt(field, q: str, after, limit: int):
+    """One page of /api/admin/users: ``field`` prefix range (or all users by id when None)."""
+    completed = (select(func.count()).select_from(ProjectCompletion)
+                 .where(ProjectCompletion.user_id == User.id).scalar_subquery())
+    tasks_done = (select(func.count()).select_from(TaskProgress)
+                  .where(TaskProgress.user_id == User.id, TaskProgress.done.is_(True)).scalar_subquery())
+    stmt = select(User.id, User.username, User.admission, User.email, User.points, User.unlocked_index,
+                  completed.label('completed_projects'), tasks_done.label('tasks_done'))
+    if field is None:
+        if after is not None:
+            stmt = stmt.where(User.id > after[0])
+        return stmt.order_by(User.id).limit(limit + 1)
+    key = search_key(ADMIN_SEARCH_FIELDS[field])
+    if q:
+        stmt = stmt.where(key >= q)
+        upper = prefix_upper_bound(q)
+        if upper is not None:
+            stmt = stmt.where(key < upper)
+    else:
+        # users without an admission number have no key and are never matched
+        stmt = stmt.where(key.is_not(None))
+    if after is not None:
+        stmt = stmt.where(tuple_(key, User.id) > tuple_(*after))
+    return stmt.order_by(key, User.id).add_columns(key.label('search_key')).limit(limit + 1)
+
+
+@app.route('/api/admin/users', methods=['GET'])
+def api_admin_users():
+    """Find users by username, email or admission prefix, keyset-paginated.
+
+    ``q`` is matched case-insensitively as a prefix of the username, or of
+    the email when it contains ``@``. A ``q`` with a digit also tries the
+    admission number when the first field has no match (see
+    ``search_fields``); ``field`` picks the field explicitly. Each page is
+    one index range scan on that field's search index; without ``q`` users
+    are listed by id. ``cursor`` is the ``next_cursor`` of the previous page
+    and keeps the field the first page matched. Rows carry progress counts,
+    not the progress itself.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+    if not is_admin(user):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    q = search_text((request.args.get('q') or '').strip())
+    field = request.args.get('field') or None
+    try:
+        limit = min(max(int(request.args.get('limit', ADMIN_USERS_PAGE_SIZE)), 1), ADMIN_USERS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        after = None
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) == 3:
+                field, after = str(values[0]), (str(values[1]), int(values[2]))
+            elif field is None and not q:
+                after = (int(values[0]),)
+            else:
+                raise ValueError(cursor)
+    except (ValueError, TypeError, IndexError):
+        return jsonify({'success': False, 'message': 'Invalid limit or cursor'}), 400
+    if field is not None and field not in ADMIN_SEARCH_FIELDS:
+        return jsonify({'success': False, 'message': f"field must be one of {', '.join(ADMIN_SEARCH_FIELDS)}"}), 400
+
+    fields = [field] if field is not None or not q else search_fields(q)
+    for field in fields:
+        rows = get_db().execute(admin_users_stmt(field, q, after, limit)).all()
+        if rows:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.id] if field is None else [field, last.search_key, last.id])
+    return jsonify({
+        'success': True,
+        'field': field,
+        'users': [{
+            'id': r.id,
+            'username': r.username,
+            'admission': r.admission,
+            'email': r.email,
+            'points': r.points,
+            'unlocked_index': r.unlocked_index,
+            'completed_projects': r.completed_projects,
+            'tasks_done': r.tasks_done,
+        } for r in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@app.route('/api/admin/analytics', methods=['GET'])
+def api_admin_analytics():
+    """Completion rates per project and task, users per unlocked project and the points distribution.
+
+    Read from analytics_counters, so the cost does not grow with the number of users.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+    if not is_admin(user):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    counters = get_db().execute(
+        select(AnalyticsCounter.metric, AnalyticsCounter.a, AnalyticsCounter.b, AnalyticsCounter.count)
+    ).all()
+    resp = jsonify(dict(success=True, **build_report(counters, PROJECTS, PROJECT_TASKS)))
+    resp.headers['Cache-Control'] = 'private, no-store'
+    return resp
+
 
 @app.route('/api/user/progress/task', methods=['POST'])
 def api_toggle_task():
@@ -390,26 +1593,25 @@ def api_toggle_task():
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
 
     data = request.get_json() or {}
-    project_index = int(data.get('project_index'))
-    task_index = int(data.get('task_index'))
+    try:
+        project_index, task_index = task_index_args(data.get('project_index'), data.get('task_index'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid project or task index'}), 400
     checked = bool(data.get('checked'))
 
-    db = SessionLocal()
-    try:
-        u = db.query(User).filter_by(id=user.id).first()
-        tc = u.task_completion or {}
-        key = str(project_index)
-        if key not in tc:
-            tc[key] = []
-        while len(tc[key]) <= task_index:
-            tc[key].append(False)
-        tc[key][task_index] = checked
-        u.task_completion = tc
-        db.add(u)
-        db.commit()
-        return jsonify({'success': True, 'task_completion': tc})
-    finally:
-        db.close()
+    # single-row upsert: concurrent toggles of different tasks never clobber each other
+    db = get_db()
+    flags = [(project_index, task_index, checked)]
+    deltas = CounterDeltas()
+    set_task_flags(db, user.id, flags, deltas)
+    bump_version(db, user.id)
+    apply_counter_deltas(db, deltas)
+    # the rows loaded with the user plus this change, built before the commit
+    # so a failure here rolls the write back; no re-read
+    tc = with_task_flags(user.task_completion, flags)
+    db.commit()
+    event_broker.publish(user_channel(user.id), 'progress', {'task_completion': tc})
+    return jsonify({'success': True, 'task_completion': tc})
 
 
 @app.route('/api/user/progress/complete', methods=['POST'])
@@ -419,30 +1621,82 @@ def api_complete_project():
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
 
     data = request.get_json() or {}
-    project_index = int(data.get('project_index'))
-
-    db = SessionLocal()
     try:
-        u = db.query(User).filter_by(id=user.id).first()
-        completed = u.completed_projects or []
-        unlocked_index = int(u.unlocked_index or 0)
-        points = int(u.points or 0)
+        project_index = project_index_arg(data.get('project_index'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid project index'}), 400
+
+    db = get_db()
+    deltas = CounterDeltas()
+    moved = mark_project_complete(db, user.id, project_index, deltas, (user.unlocked_index, user.points))
+    apply_counter_deltas(db, deltas)
+    state = {'completed_projects': user.completed_projects, 'unlocked_index': user.unlocked_index, 'points': user.points}
+    if moved:
+        # new values come from the locked read in mark_project_complete; no re-read
+        state['completed_projects'].append(project_index)
+        state['unlocked_index'], state['points'] = moved
+    db.commit()
+    if moved:
+        leaderboard.record_points(user.id, user.username, user.points, state['points'])
+        event_broker.publish(user_channel(user.id), 'progress', state)
+
+    return jsonify(dict(success=True, **state))
+
+
+@app.route('/api/user/progress/batch', methods=['POST'])
+def api_progress_batch():
+    """Apply several task toggles and project completions in one transaction.
+
+    Body: ``{"tasks": [{"project_index", "task_index", "checked"}, ...],
+    "complete": [project_index, ...]}``. Later toggles of the same task win.
+    Returns the resulting progress state.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
 
-        if project_index not in completed:
+    data = request.get_json() or {}
+    tasks = data.get('tasks') or []
+    complete = data.get('complete') or []
+    if not isinstance(tasks, list) or not isinstance(complete, list) or len(tasks) + len(complete) > BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'message': f'Expected up to {BATCH_MAX_OPERATIONS} operations'}), 400
+    # every operation is checked against the catalog before any is applied
+    try:
+        flags = {}
+        for op in tasks:
+            flags[task_index_args(op['project_index'], op['task_index'])] = bool(op.get('checked'))
+        complete = [project_index_arg(p) for p in complete]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid operation'}), 400
+
+    db = get_db()
+    flags = [(p, t, done) for (p, t), done in flags.items()]
+    deltas = CounterDeltas()
+    if flags:
+        set_task_flags(db, user.id, flags, deltas)
+        bump_version(db, user.id)
+    completed = user.completed_projects
+    moved = None
+    for project_index in complete:
+        result = mark_project_complete(db, user.id, project_index, deltas, moved or (user.unlocked_index, user.points))
+        if result:
             completed.append(project_index)
-            points += 50
-            if project_index == unlocked_index and unlocked_index < len(PROJECTS) - 1:
-                unlocked_index += 1
-
-            u.completed_projects = completed
-            u.unlocked_index = unlocked_index
-            u.points = points
-            db.add(u)
-            db.commit()
-
-        return jsonify({'success': True, 'completed_projects': u.completed_projects, 'unlocked_index': u.unlocked_index, 'points': u.points})
-    finally:
-        db.close()
+            moved = result
+    apply_counter_deltas(db, deltas)
+
+    # the progress loaded with the user plus this batch's changes, built
+    # before the commit so a failure here rolls the batch back; no re-read
+    state = {
+        'task_completion': with_task_flags(user.task_completion, flags),
+        'completed_projects': completed,
+        'unlocked_index': moved[0] if moved else user.unlocked_index,
+        'points': moved[1] if moved else user.points
+    }
+    db.commit()
+    if moved:
+        leaderboard.record_points(user.id, user.username, user.points, state['points'])
+    event_broker.publish(user_channel(user.id), 'progress', state)
+    return jsonify(dict(success=True, **state))
 
 
 @app.route('/api/user/progress/reset', methods=['POST'])
@@ -451,18 +1705,24 @@ def api_reset_progress():
     if not user:
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
 
-    db = SessionLocal()
-    try:
-        u = db.query(User).filter_by(id=user.id).first()
-        u.unlocked_index = 0
-        u.completed_projects = []
-        u.task_completion = {}
-        u.points = 0
-        db.add(u)
-        db.commit()
-        return jsonify({'success': True})
-    finally:
-        db.close()
+    db = get_db()
+    deltas = CounterDeltas()
+    old, _ = move_user(db, user.id, (user.unlocked_index, user.points), lambda unlocked, points: (0, 0))
+    for p, t, done in db.execute(delete(TaskProgress).where(TaskProgress.user_id == user.id)
+                                 .returning(TaskProgress.project_index, TaskProgress.task_index, TaskProgress.done)):
+        if done:
+            deltas.add('task_done', p, t, n=-1)
+    for (p,) in db.execute(delete(ProjectCompletion).where(ProjectCompletion.user_id == user.id)
+                           .returning(ProjectCompletion.project_index)):
+        deltas.add('project_completed', p, n=-1)
+    deltas.user_moved(*old, 0, 0)
+    apply_counter_deltas(db, deltas)
+    db.commit()
+    leaderboard.record_points(user.id, user.username, old[1], 0)
+    event_broker.publish(user_channel(user.id), 'progress', {
+        'task_completion': {}, 'completed_projects': [], 'unlocked_index': 0, 'points': 0
+    })
+    return jsonify({'success': True})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+"""ASGI entry point.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:application --workers 4
+
+Serves every route of ``app.py``. The chat endpoints and the SSE stream run
+as coroutines, so an open ``/api/stream`` connection costs a suspended
+coroutine instead of a worker thread and one process can hold thousands of
+them. All other routes are handed to the Flask app through a WSGI bridge
+running on a small thread pool. ``waitress-serve app:app`` / gunicorn keep
+working unchanged.
+
+- The current user is read from Flask's signed session cookie and looked up
+  through an async SQLAlchemy engine (aiosqlite for SQLite, asyncpg for
+  PostgreSQL).
+- Chat history files are read and appended on a bounded thread pool
+  (``ASGI_FILE_THREADS``); that is also how aiofiles implements async file
+  I/O, without a second implementation of ``ChatStore``.
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import anyio
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+
+import app as kevs
+from db_profiles import create_profiled_async_engine
+
+ASGI_FILE_THREADS = int(os.environ.get('ASGI_FILE_THREADS', '32'))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+
+
+def async_database_url(url: str) -> str:
+    """Map ``DATABASE_URL`` to the matching async driver."""
+    scheme, sep, rest = url.partition('://')
+    base = scheme.split('+', 1)[0]
+    if base == 'sqlite':
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if base in ('postgresql', 'postgres'):
+        return f"postgresql+asyncpg{sep}{rest}"
+    raise ValueError(f"no async driver configured for {scheme}")
+
+
+async_engine = create_profiled_async_engine(async_database_url(kevs.DATABASE_URL), kevs.DB_PROFILE)
+file_io_limiter = anyio.CapacityLimiter(ASGI_FILE_THREADS)
+session_serializer = kevs.app.session_interface.get_signing_serializer(kevs.app)
+
+
+async def run_io(fn, *args):
+    return await anyio.to_thread.run_sync(fn, *args, limiter=file_io_limiter)
+
+
+def error(message: str, status: int) -> JSONResponse:
+    return JSONResponse({'success': False, 'message': message}, status_code=status)
+
+
+async def current_user(request):
+    """``(id, username)`` of the logged-in user, from the Flask session cookie."""
+    cookie = request.cookies.get(kevs.app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    try:
+        data = session_serializer.loads(cookie, max_age=int(kevs.app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    if data.get('user_id') is not None:
+        stmt = select(kevs.User.id, kevs.User.username).where(kevs.User.id == data['user_id'])
+    elif data.get('username'):
+        stmt = select(kevs.User.id, kevs.User.username).where(kevs.User.username == data['username'])
+    else:
+        return None
+    async with async_engine.connect() as conn:
+        return (await conn.execute(stmt)).first()
+
+
+def rate_limited(request, route: str, user_id: int):
+    """The 429 response ``enforce_rate_limits`` would give, or ``None``."""
+    if not kevs.RATE_LIMIT_ENABLED:
+        return None
+    try:
+        kevs.rate_limiter.check(request.method, route, user_id, request.client.host if request.client else None)
+    except kevs.RateLimited as e:
+        kevs.rate_limited_total.inc(request.method, route)
+        resp = error('Too many requests, please slow down', 429)
+        resp.headers['Retry-After'] = str(e.retry_after)
+        return resp
+    return None
+
+
+def observed(route: str):
+    """Record the same metrics and request log lines as the Flask hooks."""
+    def decorate(handler):
+        async def endpoint(request):
+            started = time.perf_counter()
+            kevs.metrics.start()
+            kevs.http_requests_in_flight.inc(route)
+            status = 500
+            try:
+                resp = await handler(request)
+                status = resp.status_code
+                return resp
+            finally:
+                duration = time.perf_counter() - started
+                kevs.http_requests_in_flight.dec(route)
+                kevs.http_requests_total.inc(request.method, route, status)
+                kevs.http_request_duration.observe(duration, request.method, route)
+                if kevs.REQUEST_LOG_ENABLED and (status >= 500 or kevs.request_logger.sampled()):
+                    kevs.request_logger.log({
+                        'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+                        'method': request.method,
+                        'path': request.url.path,
+                        'status': status,
+                        'duration_ms': round(duration * 1000, 3),
+                        'request_bytes': int(request.headers.get('content-length') or 0),
+                        'response_bytes': None,
+                    })
+        return endpoint
+    return decorate
+
+
+@observed('/api/chat')
+async def chat_get(request):
+    user = await current_user(request)
+    if user is None:
+        return error('Not logged in', 401)
+    limited = rate_limited(request, '/api/chat', user.id)
+    if limited is not None:
+        return limited
+    try:
+        limit, since, before = kevs.parse_chat_query(request.query_params)
+    except ValueError:
+        return error('Invalid limit, since or before', 400)
+
+    etag = await run_io(kevs.chat_etag, user.id, user.username, request.scope['query_string'])
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': kevs.PRIVATE_CACHE_CONTROL, 'Vary': 'Cookie'}
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        return Response(status_code=304, headers=headers)
+    page = await run_io(kevs.chat_page, user.username, limit, since, before)
+    return JSONResponse(page, headers=headers)
+
+
+@observed('/api/chat')
+async def chat_post(request):
+    user = await current_user(request)
+    if user is None:
+        return error('Not logged in', 401)
+    limited = rate_limited(request, '/api/chat', user.id)
+    if limited is not None:
+        return limited
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    text = ((data or {}).get('message') or '').strip() if isinstance(data, dict) else ''
+    if not text:
+        return error('Empty message', 400)
+    body, status = await run_io(kevs.add_chat_message, user.id, user.username, text)
+    return JSONResponse(body, status_code=status)
+
+
+@observed('/api/stream')
+async def stream(request):
+    """Coroutine version of ``api_stream``: same events, no thread per connection."""
+    user = await current_user(request)
+    if user is None:
+        return error('Not logged in', 401)
+    limited = rate_limited(request, '/api/stream', user.id)
+    if limited is not None:
+        return limited
+    sub = kevs.event_broker.subscribe_async(kevs.user_channel(user.id))
+
+    async def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                payload = await sub.get(timeout=kevs.SSE_KEEPALIVE_SECONDS)
+                yield payload if payload is not None else ': keepalive\n\n'
+        finally:
+            kevs.event_broker.unsubscribe(sub)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await async_engine.dispose()
+
+
+# same policy as CORS(app, supports_credentials=True, expose_headers=['ETag']) in app.py
+cors = [Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+                   allow_methods=['GET', 'POST', 'OPTIONS'], allow_headers=['*'], expose_headers=['ETag'])]
+
+application = Starlette(
+    routes=[
+        Route('/api/chat', chat_get, methods=['GET', 'OPTIONS'], middleware=cors),
+        Route('/api/chat', chat_post, methods=['POST'], middleware=cors),
+        Route('/api/stream', stream, methods=['GET', 'OPTIONS'], middleware=cors),
+        Mount('/', app=WSGIMiddleware(kevs.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
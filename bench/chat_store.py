@@ -0,0 +1,98 @@
+"""Chat history read cost with and without the segment cache, and lossless concurrent appends.
+
+Seeds one conversation of ``--messages`` messages, then times the reads a
+polling client makes on every ``GET /api/chat`` (``last_id`` for the ETag and
+the newest page through ``tail``) with the cache disabled and enabled. Then
+runs several processes with several threads each appending message pairs to
+one user at the same time and checks that every message was stored exactly
+once with consecutive ids:
+
+    python bench/chat_store.py [--messages 2000] [--processes 4] [--threads 4] [--appends 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_store import ChatStore  # noqa: E402
+
+READS = 2000
+PAGE = 50
+CACHE_BYTES = 32 * 1024 * 1024
+
+
+def message(who: str, n: int) -> dict:
+    return {'who': who, 'text': f"message number {n} with a little bit of text", 'time': '2026-10-17T10:00:00Z'}
+
+
+def time_reads(store: ChatStore, username: str) -> float:
+    started = time.perf_counter()
+    for _ in range(READS):
+        store.last_id(username)
+        store.tail(username, PAGE)
+    return (time.perf_counter() - started) / READS * 1e6
+
+
+def appender(root: str, threads: int, appends: int, out):
+    store = ChatStore(root, segment_size=100, cache_bytes=CACHE_BYTES)
+
+    def run(t):
+        for i in range(appends):
+            store.append('shared', [message('user', i), message('bot', i)])
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(threads * appends * 2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--appends', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='kevs-bench-')
+    seed = ChatStore(os.path.join(tmp, 'reads'))
+    for i in range(0, args.messages, 2):
+        seed.append('reader', [message('user', i), message('bot', i)])
+
+    print(f"poll read (last_id + newest {PAGE}), {args.messages} messages")
+    for label, cache_bytes in (('no cache', 0), ('cache', CACHE_BYTES)):
+        store = ChatStore(seed.root, cache_bytes=cache_bytes)
+        print(f"  {label:9} {time_reads(store, 'reader'):8.1f} us/read")
+    print(f"  cached {store.cache.size / 1024:.0f} KiB, {store.cache.hits} hits, {store.cache.misses} misses")
+
+    root = os.path.join(tmp, 'writes')
+    print(f"{args.processes} processes x {args.threads} threads appending to one user")
+    ctx = multiprocessing.get_context('spawn')
+    out = ctx.Queue()
+    procs = [ctx.Process(target=appender, args=(root, args.threads, args.appends, out)) for _ in range(args.processes)]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    expected = sum(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    store = ChatStore(root)
+    ids = [int(r['id']) for r in store.since('shared', 0, expected + 1)[0]]
+    lossless = ids == list(range(1, expected + 1))
+    print(f"  {expected} appended, {len(ids)} stored, {len(set(ids))} distinct ids, "
+          f"{expected / 2 / elapsed:.0f} appends/s: {'ok' if lossless else 'LOST OR DUPLICATED MESSAGES'}")
+    return 0 if lossless else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
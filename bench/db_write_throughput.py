@@ -0,0 +1,129 @@
+"""Concurrent write throughput of each DB_PROFILE on SQLite.
+
+For every profile, creates a fresh database, then runs several processes
+(like gunicorn workers) with several threads each, all doing the same
+transaction as a task toggle (upsert one task_progress row, bump
+users.version, update the analytics counters, commit) for a fixed time.
+Prints commits per second and how many transactions failed with
+"database is locked":
+
+    python bench/db_write_throughput.py [--processes 4] [--threads 8] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROFILES = ('none', 'web', 'batch')
+USERS = 50
+
+
+def _setup(db_url: str, profile: str):
+    os.environ['DATABASE_URL'] = db_url
+    os.environ['DB_PROFILE'] = profile
+    os.environ['REQUEST_LOG'] = 'false'
+    os.environ.setdefault('CHAT_DIR', os.path.join(tempfile.gettempdir(), 'kevs-bench-chats'))
+    import app as kevs
+    return kevs
+
+
+def _seed(db_url: str, profile: str, out):
+    kevs = _setup(db_url, profile)
+    kevs.init_db()
+    db = kevs.SessionLocal()
+    db.add_all(kevs.User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash='x',
+                         unlocked_index=0, points=0) for i in range(USERS))
+    db.commit()
+    out.put([u.id for u in db.query(kevs.User.id)])
+    db.close()
+
+
+def _worker(db_url: str, profile: str, user_ids: list, threads: int, seconds: float, out):
+    import threading
+
+    from sqlalchemy.exc import OperationalError
+
+    kevs = _setup(db_url, profile)
+    totals = {'commits': 0, 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def run(seed):
+        rng = random.Random(seed)
+        commits = locked = errors = 0
+        while time.perf_counter() < deadline:
+            db = kevs.SessionLocal()
+            user_id = rng.choice(user_ids)
+            try:
+                deltas = kevs.CounterDeltas()
+                kevs.set_task_flags(db, user_id, [(rng.randrange(6), rng.randrange(10), rng.random() < 0.5)], deltas)
+                kevs.bump_version(db, user_id)
+                kevs.apply_counter_deltas(db, deltas)
+                db.commit()
+                commits += 1
+            except OperationalError as e:
+                db.rollback()
+                if 'locked' in str(e):
+                    locked += 1
+                else:
+                    errors += 1
+            finally:
+                db.close()
+        with lock:
+            totals['commits'] += commits
+            totals['locked'] += locked
+            totals['errors'] += errors
+
+    pool = [threading.Thread(target=run, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(totals)
+
+
+def bench_profile(profile: str, processes: int, threads: int, seconds: float) -> dict:
+    ctx = multiprocessing.get_context('spawn')
+    tmp = tempfile.mkdtemp(prefix='kevs-bench-')
+    db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    out = ctx.Queue()
+
+    seeder = ctx.Process(target=_seed, args=(db_url, profile, out))
+    seeder.start()
+    user_ids = out.get()
+    seeder.join()
+
+    workers = [ctx.Process(target=_worker, args=(db_url, profile, user_ids, threads, seconds, out))
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    results = [out.get() for _ in workers]
+    for p in workers:
+        p.join()
+    return {key: sum(r[key] for r in results) for key in ('commits', 'locked', 'errors')}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.seconds:g}s per profile")
+    for profile in args.profiles.split(','):
+        r = bench_profile(profile, args.processes, args.threads, args.seconds)
+        print(f"{profile:6}  {r['commits'] / args.seconds:8.1f} commits/s  "
+              f"{r['locked']:6} locked  {r['errors']:4} other errors")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Cost per chat message of the intent matcher as the rule count grows.
+
+Builds matchers with synthetic rules (1-3 word keywords drawn from a large
+vocabulary) and times ``match`` on a fixed set of messages with the reply
+cache disabled, so every call does a full scan:
+
+    python bench/intents.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intents import IntentMatcher  # noqa: E402
+
+RULE_COUNTS = (5, 50, 500, 5000, 20000)
+MESSAGES = 2000
+
+
+def main() -> int:
+    rng = random.Random(42)
+    vocabulary = [f"w{i}" for i in range(50000)]
+    messages = [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(3, 25))) for _ in range(MESSAGES)]
+    for count in RULE_COUNTS:
+        rules = [{
+            'name': f"intent{i}",
+            'priority': rng.randint(0, 100),
+            'keywords': [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3))) for _ in range(4)],
+            'reply': 'reply {name}',
+        } for i in range(count)]
+        matcher = IntentMatcher(rules, 'default', 'empty', cache_size=0)
+        started = time.perf_counter()
+        matched = sum(matcher.match(m) is not matcher.default for m in messages)
+        elapsed = time.perf_counter() - started
+        print(f"{count:6} rules  {elapsed / MESSAGES * 1e6:7.2f} us/message  ({matched}/{MESSAGES} matched)")
+
+    cached = IntentMatcher(rules, 'default', 'empty', cache_size=1024)
+    hot = messages[:50]
+    started = time.perf_counter()
+    for _ in range(40):
+        for m in hot:
+            cached.match(m)
+    print(f"cached (50 repeated messages)  {(time.perf_counter() - started) / 2000 * 1e6:7.2f} us/message")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
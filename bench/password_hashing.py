@@ -0,0 +1,164 @@
+"""Login throughput and cheap-endpoint latency under a password hashing load.
+
+Serves the app on a fixed pool of ``--server-threads`` request threads (as
+waitress or ``gunicorn -k gthread`` do; extra connections wait for a free
+thread) and runs ``--clients`` threads that log in over HTTP as fast as they
+can while one probe thread requests ``/api/projects`` and records its
+latency. The run is done twice: with hashing effectively inline (one hashing
+thread per client, no queue limit or wait timeout) and with the configured
+bounded pool from ``passwords.py``:
+
+    python bench/password_hashing.py --clients 32 --server-threads 8 --seconds 5
+
+Logins rejected with 503 (queue full or waited too long) are counted
+separately and retried after ``Retry-After``; they are the backpressure
+working, not errors.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix='kevs-bench-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('CHAT_DIR', os.path.join(TMP, 'chats'))
+os.environ.setdefault('REQUEST_LOG', 'false')
+# logins come from one client; measure hashing, not the login rate limit
+os.environ.setdefault('RATE_LIMIT', 'false')
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler  # noqa: E402
+
+import app as kevs  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug's server with a fixed number of request threads."""
+
+    def __init__(self, threads: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def request(port: int, method: str, path: str, body=None) -> tuple:
+    # a new connection per request, so every one waits for a free server thread
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status, resp.headers
+    finally:
+        conn.close()
+
+
+def run(hasher: PasswordHasher, port: int, clients: int, seconds: float) -> dict:
+    kevs.password_hasher = hasher
+    stop = threading.Event()
+    counts = {'ok': 0, 'busy': 0, 'other': 0}
+    login_latency, probe_latency = [], []
+    lock = threading.Lock()
+
+    def login():
+        while not stop.is_set():
+            started = time.perf_counter()
+            status, headers = request(port, 'POST', '/api/login', {'username': 'demo', 'password': 'demo123'})
+            elapsed = time.perf_counter() - started
+            key = 'ok' if status == 200 else 'busy' if status == 503 else 'other'
+            with lock:
+                counts[key] += 1
+                if key == 'ok':
+                    login_latency.append(elapsed)
+            if key == 'busy':
+                # as the SPA would: back off for Retry-After instead of hammering
+                stop.wait(float(headers.get('Retry-After') or 1))
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            request(port, 'GET', '/api/projects')
+            probe_latency.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login) for _ in range(clients)] + [threading.Thread(target=probe)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        'logins_per_s': counts['ok'] / seconds,
+        'rejected': counts['busy'],
+        'errors': counts['other'],
+        'login_p50_ms': percentile(login_latency, 50) * 1000,
+        'login_p99_ms': percentile(login_latency, 99) * 1000,
+        'projects_p50_ms': percentile(probe_latency, 50) * 1000,
+        'projects_p95_ms': percentile(probe_latency, 95) * 1000,
+        'projects_p99_ms': percentile(probe_latency, 99) * 1000,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--server-threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    kevs.init_db()
+    server = PooledWSGIServer(args.server_threads, '127.0.0.1', 0, kevs.app, handler=QuietHandler)
+    port = server.socket.getsockname()[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    configured = kevs.password_hasher
+    scenarios = [
+        ('inline', PasswordHasher(configured.method, workers=args.clients, max_queue=0, max_wait=None)),
+        (f"bounded ({configured.workers} workers, queue {configured.max_queue}, "
+         f"max wait {configured.max_wait}s)", configured),
+    ]
+    print(f"{args.clients} login clients, {args.server_threads} server threads")
+    for name, hasher in scenarios:
+        r = run(hasher, port, args.clients, args.seconds)
+        print(f"{name}:")
+        print(f"  logins/s {r['logins_per_s']:.1f}  rejected(503) {r['rejected']}  errors {r['errors']}  "
+              f"login p50 {r['login_p50_ms']:.0f}ms p99 {r['login_p99_ms']:.0f}ms")
+        print(f"  /api/projects p50 {r['projects_p50_ms']:.1f}ms p95 {r['projects_p95_ms']:.1f}ms "
+              f"p99 {r['projects_p99_ms']:.1f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Count SQL statements issued per API request.
+
+Runs the app against a throwaway SQLite database and prints how many
+queries each endpoint executes, using SQLAlchemy's ``before_cursor_execute``
+engine event. Exits non-zero if an endpoint exceeds its budget, so it can be
+used as a regression check:
+
+    python bench/query_counts.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix='kevs-bench-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('CHAT_DIR', os.path.join(TMP, 'chats'))
+
+from sqlalchemy import event  # noqa: E402
+
+import app as kevs  # noqa: E402
+
+# endpoint -> maximum number of statements per request
+# (the user row is loaded together with its task_progress and
+# project_completion rows in one statement; progress writes also bump
+# users.version, the /api/user ETag, and add one upsert of the analytics
+# counters; completing and resetting move unlocked_index/points with a
+# compare-and-set UPDATE against the values loaded with the user)
+BUDGETS = [
+    ('GET', '/api/user', None, 1),
+    ('GET', '/api/user', 'revalidate', 1),
+    ('POST', '/api/user/progress/task', {'project_index': 0, 'task_index': 1, 'checked': True}, 4),
+    ('POST', '/api/user/progress/complete', {'project_index': 0}, 4),
+    ('POST', '/api/user/progress/batch', {'tasks': [{'project_index': 1, 'task_index': i, 'checked': True} for i in range(4)]}, 4),
+    ('POST', '/api/user/progress/reset', None, 5),
+    ('GET', '/api/chat', None, 1),
+]
+
+
+def main() -> int:
+    kevs.init_db()
+    statements = []
+
+    @event.listens_for(kevs.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = kevs.app.test_client()
+    client.post('/api/login', json={'username': 'demo', 'password': 'demo123'})
+
+    failed = False
+    for method, path, body, budget in BUDGETS:
+        headers = {}
+        if body == 'revalidate':
+            # conditional GET with the ETag of the current representation -> 304
+            headers['If-None-Match'] = client.open(path, method=method).headers['ETag']
+            body = None
+        statements.clear()
+        resp = client.open(path, method=method, json=body, headers=headers)
+        n = len(statements)
+        status = 'ok' if n <= budget else 'OVER BUDGET'
+        failed = failed or n > budget
+        print(f"{method:4} {path:32} {resp.status_code}  queries={n} (budget {budget})  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
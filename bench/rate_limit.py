@@ -0,0 +1,90 @@
+"""Cost of a rate limit check, and how well each backend holds a shared quota.
+
+Times ``RateLimiter.check`` for a route with one policy over many distinct
+clients, for both backends and with 1 and 8 threads. Then runs several
+processes that hammer one client's bucket (``100/s per ip burst 100``) for two
+seconds and counts how many requests got through: the SQLite backend should
+admit about 300 in total, the memory backend up to that per process.
+
+    python bench/rate_limit.py
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ratelimit import MemoryBackend, RateLimited, RateLimiter, SQLiteBackend, parse_policies  # noqa: E402
+
+CHECKS = 100000
+CLIENTS = 1000
+PROCESSES = 4
+POLICY = 'POST /api/chat: 100/s per ip burst 100'
+
+
+def make_backend(kind: str, path: str):
+    return SQLiteBackend(path) if kind == 'sqlite' else MemoryBackend()
+
+
+def time_checks(limiter: RateLimiter, threads: int, checks: int) -> float:
+    def run(offset):
+        for i in range(checks // threads):
+            try:
+                limiter.check('POST', '/api/chat', None, f"10.0.{offset}.{i % CLIENTS}")
+            except RateLimited:
+                pass
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def hammer(kind: str, path: str, seconds: float, out):
+    limiter = RateLimiter(parse_policies(POLICY), make_backend(kind, path))
+    admitted = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            limiter.check('POST', '/api/chat', None, '192.0.2.1')
+            admitted += 1
+        except RateLimited:
+            time.sleep(0.001)
+    out.put(admitted)
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp(prefix='kevs-bench-')
+    print(f"per-check cost ({POLICY}, {CLIENTS} clients)")
+    for kind in ('memory', 'sqlite'):
+        for threads in (1, 8):
+            limiter = RateLimiter(parse_policies(POLICY), make_backend(kind, os.path.join(tmp, f"cost-{threads}.db")))
+            checks = CHECKS if kind == 'memory' else CHECKS // 10
+            print(f"  {kind:6} {threads} thread(s)  {time_checks(limiter, threads, checks):8.2f} us/check")
+    unlimited = RateLimiter([], MemoryBackend())
+    print(f"  route without a policy     {time_checks(unlimited, 1, CHECKS):8.2f} us/check")
+
+    print(f"one client, {PROCESSES} processes, 2s (ideal: ~300 admitted in total)")
+    ctx = multiprocessing.get_context('spawn')
+    for kind in ('memory', 'sqlite'):
+        out = ctx.Queue()
+        path = os.path.join(tmp, 'shared.db')
+        procs = [ctx.Process(target=hammer, args=(kind, path, 2.0, out)) for _ in range(PROCESSES)]
+        for p in procs:
+            p.start()
+        admitted = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        print(f"  {kind:6} admitted {sum(admitted):5}  per process {admitted}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Cold start cost: import time and time to the first responses.
+
+Each run starts a fresh interpreter (as a serverless cold start would) that
+imports the app under ``-X importtime``, then serves ``GET /api/projects``
+(no database) and a login for an unknown user (first database use, which
+creates the engine) through the test client. Reports the median over
+``--runs`` of the process wall time, the app's import time, both first
+responses and the modules that cost the most to import:
+
+    python bench/startup.py --runs 7 --out startup.json
+    python bench/startup.py --baseline startup.json
+
+With ``--baseline`` it exits 1 when a timing is more than ``--tolerance``
+(default 25%) slower than the baseline.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+status = client.get('/api/projects').status_code
+first = time.perf_counter()
+db_status = client.post('/api/login', json={'username': 'nobody', 'password': 'x'}).status_code
+first_db = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_response_ms': (first - imported) * 1000,
+                  'first_db_response_ms': (first_db - first) * 1000, 'status': [status, db_status]}))
+"""
+TIMINGS = ('process_ms', 'import_ms', 'first_response_ms', 'first_db_response_ms')
+
+
+def parse_importtime(stderr: str) -> dict:
+    """``{module: (self_us, cumulative_us)}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative, name = (part.strip() for part in line.replace('import time:', '|', 1).split('|'))
+        modules[name] = (int(self_us), int(cumulative))
+    return modules
+
+
+def run_once(env: dict) -> tuple:
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_ms'] = process_ms
+    return result, parse_importtime(proc.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--out', help='write the results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='kevs-startup-')
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+    env.setdefault('CHAT_DIR', os.path.join(tmp, 'chats'))
+    env.setdefault('REQUEST_LOG', 'false')
+    env.setdefault('SERVERLESS', 'true')
+
+    # the first run creates the schema and writes .pyc files; it is not counted
+    run_once(env)
+    runs, imports = [], {}
+    for _ in range(args.runs):
+        result, modules = run_once(env)
+        runs.append(result)
+        for name, timing in modules.items():
+            imports.setdefault(name, []).append(timing)
+
+    timings = {key: round(statistics.median(r[key] for r in runs), 2) for key in TIMINGS}
+    slowest = sorted(((statistics.median(t[1] for t in v), name) for name, v in imports.items()
+                      if name.count('.') == 0), reverse=True)[:args.top]
+    results = {
+        'meta': {'runs': args.runs, 'python': sys.version.split()[0], 'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
+        'timings': timings,
+        'imports_ms': {name: round(us / 1000, 2) for us, name in slowest},
+        'status': runs[-1]['status'],
+    }
+
+    print(f"median of {args.runs} cold starts")
+    for key in TIMINGS:
+        print(f"  {key:22} {timings[key]:8.1f}")
+    print('top-level imports (cumulative ms)')
+    for name, ms in results['imports_ms'].items():
+        print(f"  {name:30} {ms:8.1f}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = [f"{key}: {baseline['timings'][key]:.1f} -> {timings[key]:.1f} ms" for key in TIMINGS
+                    if key in baseline['timings'] and timings[key] > baseline['timings'][key] * (1 + args.tolerance)]
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Build fingerprinted, precompressed static assets into ``dist/``.
+
+    python build_assets.py
+
+Every asset is copied to ``dist/`` under a content-hashed name
+(``style.<hash>.css``), references in ``index.html`` and ``style.css`` are
+rewritten to those names, text assets get ``.gz``/``.br`` siblings, and the
+project card images get resized WebP/JPEG derivatives. ``dist/manifest.json``
+maps source paths to their built URLs; run the app with ``ASSET_MODE=dist``
+to serve the result with immutable cache headers.
+
+Pillow (image derivatives) and brotli (``.br`` files) are optional; when one
+is missing that step is skipped with a warning.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(BASE_DIR, 'dist')
+ASSET_PREFIX = '/assets/'
+MANIFEST_NAME = 'manifest.json'
+
+COMPRESSIBLE = ('.css', '.js', '.html', '.json', '.svg')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg')
+# widths (px) generated for project card images; cards render at ~320px
+DERIVATIVE_WIDTHS = (320, 640)
+# page images above this size are re-encoded as WebP (capped at MAX_IMAGE_WIDTH)
+OPTIMIZE_MIN_BYTES = 100 * 1024
+MAX_IMAGE_WIDTH = 1600
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional
+    Image = None
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def hashed_name(rel_path: str, data: bytes, tag: str = '') -> str:
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}{tag}.{content_hash(data)}{ext}"
+
+
+def write_asset(rel_out: str, data: bytes):
+    """Write ``dist/<rel_out>`` plus precompressed variants for text assets."""
+    path = os.path.join(DIST_DIR, rel_out)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if not rel_out.endswith(COMPRESSIBLE):
+        return
+    # mtime=0 keeps the .gz output byte-for-byte reproducible
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(br)
+
+
+def build_file(rel_path: str, manifest: dict, data: bytes = None) -> str:
+    if data is None:
+        with open(os.path.join(BASE_DIR, rel_path), 'rb') as f:
+            data = f.read()
+    out = hashed_name(rel_path, data)
+    write_asset(out, data)
+    manifest['assets'][rel_path] = ASSET_PREFIX + out
+    return out
+
+
+def optimize_image(rel_path: str, data: bytes, manifest: dict):
+    """Point references to a large PNG/JPEG at a (smaller) WebP re-encode."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if img.width > MAX_IMAGE_WIDTH:
+            img = img.resize((MAX_IMAGE_WIDTH, max(1, round(img.height * MAX_IMAGE_WIDTH / img.width))), Image.LANCZOS)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        buf = io.BytesIO()
+        img.save(buf, format='WEBP', quality=82, method=6)
+    webp = buf.getvalue()
+    if len(webp) >= len(data):
+        return
+    out = hashed_name(os.path.splitext(rel_path)[0] + '.webp', webp)
+    write_asset(out, webp)
+    manifest['originals'][rel_path] = manifest['assets'][rel_path]
+    manifest['assets'][rel_path] = ASSET_PREFIX + out
+
+
+def build_derivatives(rel_path: str, manifest: dict):
+    """Resized WebP and JPEG versions of one image, recorded as srcset strings."""
+    with Image.open(os.path.join(BASE_DIR, rel_path)) as img:
+        img.load()
+        sources = {'webp': [], 'jpeg': []}
+        for width in DERIVATIVE_WIDTHS:
+            # never upscale; the largest derivative is at most the original size
+            w = min(width, img.width)
+            h = max(1, round(img.height * w / img.width))
+            resized = img.convert('RGB').resize((w, h), Image.LANCZOS)
+            for fmt, ext, options in (('webp', '.webp', {'quality': 80, 'method': 6}),
+                                      ('jpeg', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True})):
+                buf = io.BytesIO()
+                resized.save(buf, format=fmt.upper(), **options)
+                data = buf.getvalue()
+                stem = os.path.splitext(rel_path)[0]
+                out = hashed_name(stem + ext, data, tag=f"-{w}w")
+                write_asset(out, data)
+                sources[fmt].append(f"{ASSET_PREFIX}{out} {w}w")
+            if w == img.width:
+                break
+    manifest['images'][rel_path] = {fmt: ', '.join(srcs) for fmt, srcs in sources.items()}
+
+
+def rewrite_refs(text: str, pattern: str, manifest: dict) -> str:
+    """Point references matched by ``pattern`` at their built URLs.
+
+    Any cache-busting query string (``style.css?v=1``) is dropped; the
+    content hash in the new name takes its place.
+    """
+    def sub(match):
+        built = manifest['assets'].get(match.group('path').lstrip('/'))
+        if built is None:
+            return match.group(0)
+        return match.group('pre') + built + match.group('post')
+    return re.sub(pattern, sub, text)
+
+
+HTML_REF = r'''(?P<pre>(?:src|href)=["'])(?P<path>[^"'?#:]+)(?:\?[^"']*)?(?P<post>["'])'''
+CSS_REF = r'''(?P<pre>url\(\s*["']?)(?P<path>[^"')?#:]+)(?:\?[^"')]*)?(?P<post>["']?\s*\))'''
+
+
+def project_images() -> list:
+    with open(os.path.join(BASE_DIR, 'data', 'projects.json'), 'r', encoding='utf-8') as f:
+        projects = json.load(f)['projects']
+    return sorted({p['image'] for p in projects if p.get('image')})
+
+
+def build() -> dict:
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {'assets': {}, 'images': {}, 'originals': {}}
+    if Image is None:
+        print('warning: Pillow not installed, skipping image derivatives', file=sys.stderr)
+
+    for name in sorted(os.listdir(os.path.join(BASE_DIR, 'images'))):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        rel_path = f"images/{name}"
+        build_file(rel_path, manifest)
+        size = os.path.getsize(os.path.join(BASE_DIR, rel_path))
+        if Image is not None and size >= OPTIMIZE_MIN_BYTES and name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            with open(os.path.join(BASE_DIR, rel_path), 'rb') as f:
+                optimize_image(rel_path, f.read(), manifest)
+
+    if Image is not None:
+        for rel_path in project_images():
+            build_derivatives(rel_path, manifest)
+    if brotli is None:
+        print('warning: brotli not installed, skipping .br files', file=sys.stderr)
+
+    with open(os.path.join(BASE_DIR, 'style.css'), 'r', encoding='utf-8') as f:
+        css = rewrite_refs(f.read(), CSS_REF, manifest)
+    build_file('style.css', manifest, css.encode('utf-8'))
+    build_file('main.js', manifest)
+
+    # index.html keeps its name: it is the entry point and is always revalidated
+    with open(os.path.join(BASE_DIR, 'index.html'), 'r', encoding='utf-8') as f:
+        html = rewrite_refs(f.read(), HTML_REF, manifest)
+    write_asset('index.html', html.encode('utf-8'))
+
+    with open(os.path.join(DIST_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    result = build()
+    print(f"built {len(result['assets'])} assets and {len(result['images'])} image derivative sets into {DIST_DIR}")
@@ -0,0 +1,224 @@
+"""Bulk user import and export (used by the ``import-users``/``export-users`` CLI).
+
+Imports stream a CSV or JSON Lines file in batches: each batch is checked
+against the database for existing usernames/emails, the remaining passwords
+are hashed in parallel on a process pool, and the rows are inserted in one
+transaction with ``ON CONFLICT DO NOTHING`` so a concurrent registration can
+never make the import fail. Memory use is bounded by the batch size, not the
+file size.
+
+Exports walk the users table with ``yield_per`` and fetch progress for one
+partition of users at a time, so they also run in constant memory.
+"""
+import csv
+import json
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+from sqlalchemy import or_, select
+from werkzeug.security import generate_password_hash
+
+EXPORT_FIELDS = ('id', 'username', 'admission', 'email', 'points', 'unlocked_index',
+                 'completed_projects', 'task_completion')
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[tuple]:
+    """Yield ``(line_number, row_dict)`` from a CSV (with header) or JSONL stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _hash_password(args) -> str:
+    password, method = args
+    return generate_password_hash(password, method)
+
+
+def _batches(iterable: Iterable, size: int) -> Iterator[list]:
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_users(db, rows: Iterable[tuple], method: str, workers: int = 1, batch_size: int = 500,
+                 credentials: Optional[TextIO] = None, progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Insert users from ``rows`` (as produced by ``read_rows``); returns counters.
+
+    Rows need ``username`` and ``email`` plus either ``password`` or an
+    existing werkzeug ``password_hash``. With ``credentials`` set, rows
+    without either get a random password, written there as CSV.
+    """
+    from analytics import CounterDeltas
+    from app import User, apply_counter_deltas, upsert_stmt
+
+    stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    cred_writer = csv.writer(credentials) if credentials is not None else None
+    if cred_writer is not None:
+        cred_writer.writerow(['username', 'password'])
+
+    def reject(line_number, reason):
+        stats['invalid'] += 1
+        if len(stats['errors']) < MAX_REPORTED_ERRORS:
+            stats['errors'].append(f"line {line_number}: {reason}")
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in _batches(rows, batch_size):
+            stats['read'] += len(batch)
+            candidates = {}
+            emails = set()
+            for line_number, row in batch:
+                if row is None:
+                    reject(line_number, 'unparseable row')
+                    continue
+                username = (row.get('username') or '').strip()
+                email = (row.get('email') or '').strip()
+                if not username or not email:
+                    reject(line_number, 'missing username or email')
+                    continue
+                if username in candidates or email in emails:
+                    stats['duplicates'] += 1
+                    continue
+                password = row.get('password') or ''
+                password_hash = (row.get('password_hash') or '').strip()
+                if not password and not password_hash:
+                    if cred_writer is None:
+                        reject(line_number, 'missing password (use --credentials-out to generate one)')
+                        continue
+                    password = secrets.token_urlsafe(9)
+                    row = dict(row, password=password, generated=True)
+                candidates[username] = row
+                emails.add(email)
+            if not candidates:
+                if progress:
+                    progress(stats)
+                continue
+
+            # skip rows that already exist before spending CPU on their hashes
+            existing = db.execute(
+                select(User.username, User.email).where(or_(User.username.in_(candidates), User.email.in_(emails)))
+            ).all()
+            taken_names = {u for u, _ in existing}
+            taken_emails = {e for _, e in existing}
+            fresh = [r for name, r in candidates.items()
+                     if name not in taken_names and r['email'].strip() not in taken_emails]
+            stats['duplicates'] += len(candidates) - len(fresh)
+
+            to_hash = [r for r in fresh if not (r.get('password_hash') or '').strip()]
+            chunk = max(1, len(to_hash) // (max(1, workers) * 4))
+            hashes = iter(pool.map(_hash_password, [(r['password'], method) for r in to_hash], chunksize=chunk))
+            values = []
+            for r in fresh:
+                password_hash = (r.get('password_hash') or '').strip() or next(hashes)
+                values.append({
+                    'username': r['username'].strip(),
+                    'admission': (r.get('admission') or '').strip() or None,
+                    'email': r['email'].strip(),
+                    'password_hash': password_hash,
+                    'unlocked_index': 0,
+                    'points': 0,
+                    'version': 0,
+                })
+            if values:
+                # DO NOTHING covers users registered since the existence check
+                inserted = db.connection().execute(upsert_stmt(User, None).returning(User.username), values).scalars().all()
+                deltas = CounterDeltas()
+                deltas.user_added(len(inserted))
+                apply_counter_deltas(db, deltas)
+                db.commit()
+                stats['inserted'] += len(inserted)
+                stats['duplicates'] += len(values) - len(inserted)
+                if cred_writer is not None:
+                    created = set(inserted)
+                    for r in fresh:
+                        if r.get('generated') and r['username'].strip() in created:
+                            cred_writer.writerow([r['username'].strip(), r['password']])
+            if progress:
+                progress(stats)
+    return stats
+
+
+def iter_user_records(db, batch_size: int = 1000, include_hashes: bool = False) -> Iterator[dict]:
+    """Yield one export record per user, ordered by id, in constant memory."""
+    from app import ProjectCompletion, TaskProgress, User
+
+    columns = [User.id, User.username, User.admission, User.email, User.points, User.unlocked_index]
+    if include_hashes:
+        columns.append(User.password_hash)
+    result = db.execute(select(*columns).order_by(User.id).execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        ids = [row.id for row in partition]
+        tasks = {}
+        for user_id, project_index, task_index, done in db.execute(
+            select(TaskProgress.user_id, TaskProgress.project_index, TaskProgress.task_index, TaskProgress.done)
+            .where(TaskProgress.user_id.in_(ids))
+            .order_by(TaskProgress.user_id, TaskProgress.project_index, TaskProgress.task_index)
+        ):
+            flags = tasks.setdefault(user_id, {}).setdefault(str(project_index), [])
+            while len(flags) <= task_index:
+                flags.append(False)
+            flags[task_index] = bool(done)
+        completed = {}
+        for user_id, project_index in db.execute(
+            select(ProjectCompletion.user_id, ProjectCompletion.project_index)
+            .where(ProjectCompletion.user_id.in_(ids))
+            .order_by(ProjectCompletion.user_id, ProjectCompletion.completed_at, ProjectCompletion.project_index)
+        ):
+            completed.setdefault(user_id, []).append(project_index)
+        for row in partition:
+            record = {
+                'id': row.id,
+                'username': row.username,
+                'admission': row.admission,
+                'email': row.email,
+                'points': row.points,
+                'unlocked_index': row.unlocked_index,
+                'completed_projects': completed.get(row.id, []),
+                'task_completion': tasks.get(row.id, {}),
+            }
+            if include_hashes:
+                record['password_hash'] = row.password_hash
+            yield record
+
+
+def write_records(records: Iterable[dict], out: TextIO, fmt: str, include_hashes: bool = False,
+                  progress: Optional[Callable[[int], None]] = None, progress_every: int = 1000) -> int:
+    """Write records as JSONL or CSV (nested fields JSON-encoded); returns the count."""
+    fields = EXPORT_FIELDS + (('password_hash',) if include_hashes else ())
+    writer = csv.DictWriter(out, fieldnames=fields) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writeheader()
+    count = 0
+    for record in records:
+        if writer is not None:
+            writer.writerow({k: json.dumps(v, separators=(',', ':')) if isinstance(v, (list, dict)) else v
+                             for k, v in record.items()})
+        else:
+            out.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+            out.write('\n')
+        count += 1
+        if progress and count % progress_every == 0:
+            progress(count)
+    return count
+
@@ -0,0 +1,452 @@
+"""Append-only chat history storage.
+
+Each user's conversation is kept in ``<root>/<safe-username>/`` as a series of
+JSON Lines segments. A segment is named after the id of its first message
+(``00000001.jsonl``, ``00000501.jsonl``, ...) and holds up to
+``segment_size`` messages, so appending a message never touches more than the
+newest segment and reading the tail of a conversation only parses the last
+one or two segments regardless of how long the history is.
+
+The legacy layout (a single ``<safe-username>.json`` array rewritten on every
+message) is migrated transparently on first access, or in bulk through
+``migrate_all``.
+
+Writes to one conversation (append, compaction, migration) are serialized by a
+per-user lock: a thread lock inside the process plus an ``fcntl.flock`` on
+``<root>/<safe-username>.lock`` so several workers sharing the directory
+assign message ids without racing. Parsed segments and segment listings are
+kept in a byte-bounded LRU cache; each entry remembers the ``os.stat`` of the
+file or directory it was read from and is only served while that still
+matches, so writes made by other processes are seen on the next read.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+SEGMENT_SUFFIX = '.jsonl'
+LEGACY_SUFFIX = '.json'
+LOCK_SUFFIX = '.lock'
+# rough memory cost of a parsed message on top of its JSON text
+RECORD_OVERHEAD = 400
+# filesystem clocks are coarse: a directory modified this recently may be
+# modified again without its mtime changing, so its listing is not cached yet
+RACY_NS = 1_000_000_000
+
+
+def safe_name(username: str) -> str:
+    return ''.join(c for c in username if c.isalnum() or c in ('_', '-')).lower()
+
+
+def _parse_line(line: bytes) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        # torn write from a crashed worker; compaction drops these
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class SegmentCache:
+    """LRU cache of parsed chat files, bounded by an estimate of their memory.
+
+    Entries are ``key -> (stat key, value, size)``; ``get`` only returns a
+    value whose stat key matches the one the caller just read from disk.
+    Cached values are shared between readers and must not be mutated.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max(0, int(max_bytes))
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, stat_key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat_key:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, stat_key: tuple, value, size: int):
+        with self._lock:
+            self._drop(key)
+            self._insert(key, stat_key, value, size)
+
+    def extend(self, key: str, stat_key: tuple, new_stat_key: tuple, records: list, size: int):
+        """Append ``records`` to the list cached at ``stat_key`` (write-through after an append)."""
+        with self._lock:
+            entry = self._drop(key)
+            if entry is not None and entry[0] == stat_key:
+                self._insert(key, new_stat_key, entry[1] + records, entry[2] + size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+        return entry
+
+    def _insert(self, key: str, stat_key: tuple, value, size: int):
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (stat_key, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+
+class ChatStore:
+    """Segmented JSONL chat store rooted at ``root``.
+
+    ``max_messages`` (0 = unlimited) is a retention limit applied when the
+    store compacts a conversation; compaction runs every time a new segment
+    is started and can also be triggered explicitly. ``cache_bytes``
+    (0 = disabled) bounds the memory used to cache parsed segments.
+    """
+
+    def __init__(self, root: str, segment_size: int = 500, max_messages: int = 0, cache_bytes: int = 0):
+        self.root = root
+        self.segment_size = max(1, int(segment_size))
+        self.max_messages = max(0, int(max_messages))
+        self.cache = SegmentCache(cache_bytes)
+        # username -> [lock, holders]; entries go away once nobody holds them
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._held = threading.local()
+        # directories are created by the first write, so constructing a store
+        # never touches the disk (read-only filesystems, serverless cold starts)
+
+    # -- layout -------------------------------------------------------------
+
+    def user_dir(self, username: str) -> str:
+        return os.path.join(self.root, safe_name(username))
+
+    def legacy_path(self, username: str) -> str:
+        return os.path.join(self.root, f"{safe_name(username)}{LEGACY_SUFFIX}")
+
+    def _segment_path(self, username: str, first_id: int) -> str:
+        return os.path.join(self.user_dir(username), f"{first_id:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self, username: str) -> List[int]:
+        """Return the first-message ids of the user's segments, oldest first."""
+        directory = self.user_dir(username)
+        if not os.path.isdir(directory):
+            if os.path.exists(self.legacy_path(username)):
+                self.migrate_legacy(username)
+            else:
+                return []
+        st = os.stat(directory)
+        stat_key = (st.st_ino, st.st_mtime_ns)
+        cached = self.cache.get(directory, stat_key)
+        if cached is not None:
+            return list(cached)
+        ids = []
+        for name in os.listdir(directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                try:
+                    ids.append(int(name[:-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        ids.sort()
+        if time.time_ns() - st.st_mtime_ns > RACY_NS:
+            self.cache.put(directory, stat_key, tuple(ids), 64 + 8 * len(ids))
+        return ids
+
+    # -- locking ------------------------------------------------------------
+
+    @contextmanager
+    def locked(self, username: str):
+        """Hold the user's write lock (re-entrant within a thread)."""
+        name = safe_name(username)
+        held = self._held.__dict__.setdefault('names', set())
+        if name in held:
+            yield
+            return
+        with self._locks_guard:
+            entry = self._locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                fd = None
+                if fcntl is not None:
+                    os.makedirs(self.root, exist_ok=True)
+                    fd = os.open(os.path.join(self.root, name + LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+                held.add(name)
+                try:
+                    if fd is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    yield
+                finally:
+                    held.discard(name)
+                    if fd is not None:
+                        # closing the descriptor releases the flock
+                        os.close(fd)
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[name]
+
+    # -- reading ------------------------------------------------------------
+
+    def _read_segment(self, path: str) -> List[dict]:
+        """Parsed records of one segment; the returned list must not be mutated."""
+        try:
+            # stat before reading: if a write lands in between, the cached
+            # records are newer than their stat key and get re-read next time
+            stat_key = _stat_key(os.stat(path))
+            cached = self.cache.get(path, stat_key)
+            if cached is not None:
+                return cached
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        records = [r for r in map(_parse_line, data.split(b'\n')) if r is not None]
+        self.cache.put(path, stat_key, records, len(data) + RECORD_OVERHEAD * len(records))
+        return records
+
+    @staticmethod
+    def _read_last(path: str, chunk: int = 4096) -> Optional[dict]:
+        """Read the last complete record by scanning backwards from the end."""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                end = f.tell()
+                pos = end
+                buf = b''
+                while pos > 0:
+                    step = min(chunk, pos)
+                    pos -= step
+                    f.seek(pos)
+                    buf = f.read(step) + buf
+                    lines = buf.split(b'\n')
+                    # lines[0] may be partial unless we reached the start of the file
+                    candidates = lines if pos == 0 else lines[1:]
+                    for line in reversed(candidates):
+                        record = _parse_line(line)
+                        if record is not None:
+                            return record
+                    buf = lines[0]
+        except FileNotFoundError:
+            pass
+        return None
+
+    def last_id(self, username: str, segments: Optional[List[int]] = None) -> int:
+        if segments is None:
+            segments = self._segments(username)
+        for first_id in reversed(segments):
+            path = self._segment_path(username, first_id)
+            if self.cache.max_bytes:
+                # parse (and cache) the whole newest segment: the next tail or
+                # since read of this conversation needs it anyway
+                records = self._read_segment(path)
+                last = records[-1] if records else None
+            else:
+                last = self._read_last(path)
+            if last is not None:
+                return int(last.get('id', first_id))
+        return 0
+
+    def tail(self, username: str, limit: int, before: Optional[int] = None) -> Tuple[List[dict], bool]:
+        """Return up to ``limit`` newest messages (with an id below ``before`` if given).
+
+        Messages are returned oldest first together with a flag telling whether
+        older messages exist. Ids are unique even where timestamps are not
+        (bursts, migrated history), so ``before`` never skips a message, and
+        segments starting at or after it are skipped without being read.
+        """
+        collected: List[dict] = []
+        segments = self._segments(username)
+        for pos in range(len(segments) - 1, -1, -1):
+            if before is not None and segments[pos] >= before:
+                continue
+            records = self._read_segment(self._segment_path(username, segments[pos]))
+            if before is not None:
+                records = [r for r in records if int(r.get('id', 0)) < before]
+            collected = records + collected
+            if len(collected) > limit:
+                return collected[-limit:], True
+            if len(collected) == limit:
+                return collected, pos > 0
+        return collected, False
+
+    def since(self, username: str, after_id: int, limit: int) -> Tuple[List[dict], bool]:
+        """Return up to ``limit`` messages with an id greater than ``after_id``.
+
+        Messages are returned oldest first together with a flag telling whether
+        more messages follow. Only segments that can hold newer ids are read;
+        a client that is already up to date costs a single tail read.
+        """
+        segments = self._segments(username)
+        if not segments or after_id >= self.last_id(username, segments):
+            return [], False
+        start = max(bisect_right(segments, after_id + 1) - 1, 0)
+        collected: List[dict] = []
+        for first_id in segments[start:]:
+            for record in self._read_segment(self._segment_path(username, first_id)):
+                if int(record.get('id', 0)) > after_id:
+                    collected.append(record)
+            if len(collected) > limit:
+                return collected[:limit], True
+        return collected, False
+
+    # -- writing ------------------------------------------------------------
+
+    def append(self, username: str, messages: List[dict]) -> List[dict]:
+        """Append ``messages`` and return them with their assigned ids."""
+        if not messages:
+            return []
+        with self.locked(username):
+            return self._append(username, messages)
+
+    def _append(self, username: str, messages: List[dict]) -> List[dict]:
+        segments = self._segments(username)
+        os.makedirs(self.user_dir(username), exist_ok=True)
+        next_id = self.last_id(username, segments) + 1
+        rolled = False
+        if not segments or next_id - segments[-1] >= self.segment_size:
+            first_id = next_id
+            rolled = bool(segments)
+        else:
+            first_id = segments[-1]
+
+        stored = []
+        lines = []
+        for offset, message in enumerate(messages):
+            record = dict(message, id=next_id + offset)
+            stored.append(record)
+            lines.append(json.dumps(record, ensure_ascii=False))
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        # O_APPEND keeps each write at the end of the file even with other writers
+        path = self._segment_path(username, first_id)
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            before = os.fstat(fd)
+            size = before.st_size
+            if size and os.pread(fd, 1, size - 1) != b'\n':
+                # never glue a new record onto a torn trailing line
+                payload = b'\n' + payload
+            os.write(fd, payload)
+            after = os.fstat(fd)
+        finally:
+            os.close(fd)
+        # the lock guarantees nobody else wrote in between, so a cached copy of
+        # the segment only needs the new records instead of a re-read
+        self.cache.extend(path, _stat_key(before), _stat_key(after), stored,
+                          len(payload) + RECORD_OVERHEAD * len(stored))
+
+        if rolled and self.max_messages:
+            self.compact(username)
+        return stored
+
+    def _write_segments(self, username: str, records: List[dict]) -> List[int]:
+        directory = self.user_dir(username)
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        for start in range(0, len(records), self.segment_size):
+            chunk = records[start:start + self.segment_size]
+            written.append(int(chunk[0]['id']))
+            path = self._segment_path(username, written[-1])
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for record in chunk:
+                    f.write(json.dumps(record, ensure_ascii=False))
+                    f.write('\n')
+            os.replace(tmp, path)
+        return written
+
+    def compact(self, username: str) -> int:
+        """Rewrite sealed segments: drop torn lines, apply retention, re-pack.
+
+        The newest segment is left alone so concurrent appends are never lost.
+        Returns the number of messages kept in sealed segments.
+        """
+        with self.locked(username):
+            return self._compact(username)
+
+    def _compact(self, username: str) -> int:
+        segments = self._segments(username)
+        if len(segments) < 2:
+            return 0
+        sealed = segments[:-1]
+        records: List[dict] = []
+        for first_id in sealed:
+            records.extend(self._read_segment(self._segment_path(username, first_id)))
+        if self.max_messages:
+            active = self.last_id(username, segments) - segments[-1] + 1
+            keep = max(0, self.max_messages - active)
+            records = records[len(records) - keep:] if keep else []
+        written = self._write_segments(username, records)
+        for first_id in sealed:
+            if first_id not in written:
+                os.remove(self._segment_path(username, first_id))
+        return len(records)
+
+    # -- migration ----------------------------------------------------------
+
+    def migrate_legacy(self, username: str) -> int:
+        """Convert ``<safe-username>.json`` into segments; returns message count."""
+        with self.locked(username):
+            if os.path.isdir(self.user_dir(username)):
+                # another worker migrated it while we waited for the lock
+                return 0
+            return self._migrate_legacy(username)
+
+    def _migrate_legacy(self, username: str) -> int:
+        legacy = self.legacy_path(username)
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            history = []
+        if not isinstance(history, list):
+            history = []
+        records = [dict(m, id=i) for i, m in enumerate((m for m in history if isinstance(m, dict)), start=1)]
+        self._write_segments(username, records)
+        # keep the original around until an operator deletes it
+        os.replace(legacy, legacy + '.migrated')
+        return len(records)
+
+    def legacy_usernames(self) -> List[str]:
+        """Names of the legacy ``.json`` histories under ``root`` that are not migrated yet."""
+        if not os.path.isdir(self.root):
+            return []
+        names = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(LEGACY_SUFFIX) and not os.path.isdir(self.user_dir(name[:-len(LEGACY_SUFFIX)])):
+                names.append(name[:-len(LEGACY_SUFFIX)])
+        return names
+
+    def migrate_all(self) -> List[Tuple[str, int]]:
+        """Migrate every legacy ``.json`` history under ``root``."""
+        return [(username, self.migrate_legacy(username)) for username in self.legacy_usernames()]
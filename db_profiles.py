@@ -0,0 +1,147 @@
+"""Named database tuning profiles, selected with ``DB_PROFILE``.
+
+A profile bundles connect-time settings for SQLite and pool/session settings
+for PostgreSQL:
+
+- ``web`` (default): SQLite in WAL mode with a busy timeout, so concurrent
+  gunicorn workers wait for the write lock instead of failing with
+  "database is locked"; ``synchronous=NORMAL`` (durable in WAL mode except on
+  power loss); a memory-mapped read path and a larger page cache. PostgreSQL
+  gets an explicit pool, ``pool_pre_ping`` to replace connections the server
+  or a proxy closed, and per-session statement/lock/idle timeouts.
+- ``batch``: long-running CLI jobs (imports, migrations): longer timeouts,
+  a bigger cache, no statement timeout, a small pool.
+- ``none``: SQLAlchemy defaults, as before profiles existed.
+
+Note that ``journal_mode=WAL`` is stored in the SQLite file itself; it stays
+on for every later connection, including other tools.
+"""
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+PROFILES = {
+    'none': {
+        'sqlite_pragmas': {},
+        'pool': {},
+        'pg_settings': {},
+    },
+    'web': {
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,           # ms to wait for a lock before "database is locked"
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,       # negative = KiB, i.e. 64 MiB per connection
+            'temp_store': 'MEMORY',
+        },
+        'pool': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True},
+        'pg_settings': {
+            'statement_timeout': '5s',
+            'lock_timeout': '2s',
+            'idle_in_transaction_session_timeout': '30s',
+        },
+    },
+    'batch': {
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 30000,
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -256 * 1024,
+            'temp_store': 'MEMORY',
+        },
+        'pool': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 60, 'pool_pre_ping': True},
+        'pg_settings': {
+            'statement_timeout': '0',
+            'lock_timeout': '30s',
+        },
+    },
+}
+
+
+def get_profile(name: str) -> dict:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown DB_PROFILE {name!r} (choose from {', '.join(PROFILES)})")
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    """Run ``PRAGMA`` statements on every new DBAPI connection of ``engine``."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _pg_options(settings: dict) -> str:
+    return ' '.join(f"-c {name}={value}" for name, value in settings.items())
+
+
+def _is_sqlite_file(url) -> bool:
+    # in-memory databases use a per-thread pool that takes no sizing options
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_kwargs(url: str, profile: dict) -> dict:
+    """``create_engine`` keyword arguments for ``url`` under ``profile``."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        kwargs = {'connect_args': {'check_same_thread': False}} if url.get_driver_name() == 'pysqlite' else {}
+        if _is_sqlite_file(url):
+            kwargs.update({k: v for k, v in profile['pool'].items() if k != 'pool_recycle'})
+        return kwargs
+    kwargs = dict(profile['pool'])
+    if profile['pg_settings'] and url.get_backend_name() == 'postgresql':
+        if url.get_driver_name() == 'asyncpg':
+            kwargs['connect_args'] = {'server_settings': {k: str(v) for k, v in profile['pg_settings'].items()}}
+        else:
+            kwargs['connect_args'] = {'options': _pg_options(profile['pg_settings'])}
+    return kwargs
+
+
+def create_profiled_engine(url: str, profile_name: str):
+    profile = get_profile(profile_name)
+    engine = create_engine(url, **engine_kwargs(url, profile))
+    if engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(engine, profile['sqlite_pragmas'])
+    return engine
+
+
+def create_profiled_async_engine(url: str, profile_name: str):
+    """Async counterpart (aiosqlite / asyncpg) used by asgi.py."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    profile = get_profile(profile_name)
+    engine = create_async_engine(url, **engine_kwargs(url, profile))
+    if engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(engine.sync_engine, profile['sqlite_pragmas'])
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """Current connection pool counters, for diagnostics and metrics."""
+    pool = engine.pool
+    stats = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    return stats
+
+
+def sqlite_settings(engine, names=('journal_mode', 'busy_timeout', 'synchronous', 'mmap_size', 'cache_size')) -> Optional[dict]:
+    """The PRAGMA values a pooled SQLite connection actually runs with."""
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
@@ -0,0 +1,247 @@
+"""In-process publish/subscribe for Server-Sent Events.
+
+``EventBroker`` fans events out to per-connection queues. Where an event comes
+from is decided by a backend:
+
+- ``MemoryBackend`` delivers straight to the local broker (single process).
+- ``SQLiteBackend`` appends events to a small SQLite log that every worker
+  process tails, so several gunicorn workers on one host see the same events
+  without running an external message broker.
+
+Events are encoded to the SSE wire format once per publish and the same
+bytes are handed to every subscriber, so an idle connection costs one queue
+and one blocked thread (``Subscription``, WSGI) or one suspended coroutine
+(``AsyncSubscription``, ASGI).
+
+Nothing is opened or imported ahead of need: the SQLite log is created by the
+first publish or subscribe, and asyncio is imported by the first async
+subscriber (WSGI deployments never load it).
+"""
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Set
+
+if TYPE_CHECKING:
+    import asyncio
+
+DispatchFn = Callable[[int, str, str, str], None]
+
+
+def encode_sse(event_id: int, event: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """A single client connection's view of a channel."""
+
+    def __init__(self, channel: str, maxsize: int = 100):
+        self.channel = channel
+        self.queue: 'queue.Queue[str]' = queue.Queue(maxsize=maxsize)
+
+    def offer(self, payload: str):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            # slow consumer: drop rather than block the publisher
+            pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the next encoded event, or ``None`` if ``timeout`` elapsed."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """A subscription consumed by a coroutine on ``loop``.
+
+    Events are dispatched from publisher or poller threads, so they are
+    handed to the loop with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, channel: str, loop: 'asyncio.AbstractEventLoop', maxsize: int = 100):
+        import asyncio
+
+        self.channel = channel
+        self.loop = loop
+        self.queue: 'asyncio.Queue[str]' = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, payload: str):
+        if self.queue.full():
+            return  # slow consumer: drop rather than block the publisher
+        self.queue.put_nowait(payload)
+
+    def offer(self, payload: str):
+        try:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            pass  # loop closed; the subscriber is going away
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        import asyncio
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MemoryBackend:
+    """Deliver events to subscribers of this process only."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._dispatch: Optional[DispatchFn] = None
+
+    def start(self, dispatch: DispatchFn):
+        self._dispatch = dispatch
+
+    def publish(self, channel: str, event: str, data: str):
+        if self._dispatch is not None:
+            self._dispatch(next(self._ids), channel, event, data)
+
+
+class SQLiteBackend:
+    """Share events between worker processes through a local SQLite log.
+
+    Publishers insert a row; each process runs one poller thread that reads
+    rows newer than the last id it has seen and dispatches them locally.
+    Rows older than ``retention`` seconds are pruned by publishers.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.2, retention: float = 60.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self._created = False
+
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's connection; the first one creates the file and the table."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not self._created:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._created:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS events ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                    'event TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)'
+                )
+                self._created = True
+            self._local.conn = conn
+        return conn
+
+    def start(self, dispatch: DispatchFn):
+        if self._thread is not None:
+            return
+        row = self._conn().execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()
+        self._thread = threading.Thread(target=self._poll, args=(dispatch, row[0]), name='sse-sqlite-poller', daemon=True)
+        self._thread.start()
+
+    def _poll(self, dispatch: DispatchFn, last_id: int):
+        conn = self._conn()
+        while True:
+            try:
+                rows = conn.execute(
+                    'SELECT id, channel, event, data FROM events WHERE id > ? ORDER BY id LIMIT 500', (last_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print('SSE poller error', e)
+                rows = []
+            for event_id, channel, event, data in rows:
+                last_id = event_id
+                dispatch(event_id, channel, event, data)
+            if len(rows) < 500:
+                time.sleep(self.poll_interval)
+
+    def publish(self, channel: str, event: str, data: str):
+        now = time.time()
+        conn = self._conn()
+        conn.execute('INSERT INTO events (channel, event, data, created) VALUES (?, ?, ?, ?)', (channel, event, data, now))
+        if now - self._last_prune > self.retention:
+            self._last_prune = now
+            conn.execute('DELETE FROM events WHERE created < ?', (now - self.retention,))
+
+
+class EventBroker:
+    """Route published events to the subscriptions of each channel."""
+
+    def __init__(self, backend=None, queue_size: int = 100):
+        self.backend = backend or MemoryBackend()
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _dispatch(self, event_id: int, channel: str, event: str, data: str):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        if not targets:
+            return
+        payload = encode_sse(event_id, event, data)
+        for sub in targets:
+            sub.offer(payload)
+
+    def _ensure_started(self):
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.backend.start(self._dispatch)
+                    self._started = True
+
+    def publish(self, channel: str, event: str, data: dict):
+        self._ensure_started()
+        try:
+            self.backend.publish(channel, event, json.dumps(data, separators=(',', ':')))
+        except Exception as e:
+            # events are a best-effort notification; never fail the request
+            print('Failed to publish event', e)
+
+    def subscribe(self, channel: str) -> Subscription:
+        return self._add(Subscription(channel, maxsize=self.queue_size))
+
+    def subscribe_async(self, channel: str) -> AsyncSubscription:
+        """Subscribe from a coroutine; events arrive on the running event loop."""
+        import asyncio
+
+        return self._add(AsyncSubscription(channel, asyncio.get_running_loop(), maxsize=self.queue_size))
+
+    def _add(self, sub):
+        self._ensure_started()
+        with self._lock:
+            self._subscribers.setdefault(sub.channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+def create_broker(kind: str, sqlite_path: str) -> EventBroker:
+    """Build a broker for ``EVENT_BACKEND`` (``memory`` or ``sqlite``)."""
+    if kind == 'sqlite':
+        return EventBroker(SQLiteBackend(sqlite_path))
+    if kind != 'memory':
+        raise ValueError(f"unknown event backend: {kind}")
+    return EventBroker(MemoryBackend())
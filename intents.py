@@ -0,0 +1,115 @@
+"""Keyword intent matching for the chat bot.
+
+Intents are loaded from a JSON file (``data/intents.json``)::
+
+    {"empty": "...", "default": "...",
+     "intents": [{"name": "points", "priority": 40,
+                  "keywords": ["points", "score"], "reply": "Hi {name} ..."}]}
+
+All keywords are compiled into one token trie: a message is lowercased and
+split into word tokens, and every keyword phrase that occurs as a whole run of
+tokens is found in a single pass whose cost depends on the message length and
+the longest phrase, not on how many rules exist. Matching on tokens also
+means "hi" no longer fires inside "this".
+
+When several intents match, the highest ``priority`` wins; ties go to the
+longer phrase, then to the one mentioned first, then to file order. Replies are
+``str.format`` templates; ``{name}`` is the user's name. The intent chosen for
+a normalized message is cached, since a handful of phrasings make up most of
+the traffic.
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+# trie nodes map a token to the next node; this key holds the intents ending there
+_END = ''
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(TOKEN_RE.findall((text or '').lower()))
+
+
+class _TemplateFields(dict):
+    def __missing__(self, key):
+        # unknown placeholders stay as written instead of raising
+        return '{' + key + '}'
+
+
+class Intent:
+    def __init__(self, name: str, reply: str, priority: int = 0, order: int = 0):
+        self.name = name
+        self.reply = reply
+        self.priority = priority
+        self.order = order
+
+    def render(self, **fields) -> str:
+        return self.reply.format_map(_TemplateFields(fields))
+
+
+class IntentMatcher:
+    def __init__(self, intents: List[dict], default: str, empty: str, cache_size: int = 1024):
+        self.default = Intent('default', default)
+        self.empty = Intent('empty', empty)
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple[str, ...], Optional[Intent]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._trie: Dict[str, dict] = {}
+        self.intents: List[Intent] = []
+        for order, spec in enumerate(intents):
+            intent = Intent(spec['name'], spec['reply'], int(spec.get('priority', 0)), order)
+            self.intents.append(intent)
+            for keyword in spec.get('keywords', ()):
+                self._add(tokenize(keyword), intent)
+
+    @classmethod
+    def from_file(cls, path: str, cache_size: int = 1024) -> 'IntentMatcher':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('intents', []), data['default'], data['empty'], cache_size=cache_size)
+
+    def _add(self, tokens: Tuple[str, ...], intent: Intent):
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_END, []).append((intent, len(tokens)))
+
+    def _scan(self, tokens: Tuple[str, ...]) -> Optional[Intent]:
+        best, best_key = None, None
+        for start in range(len(tokens)):
+            node = self._trie
+            for pos in range(start, len(tokens)):
+                node = node.get(tokens[pos])
+                if node is None:
+                    break
+                for intent, length in node.get(_END, ()):
+                    key = (-intent.priority, -length, start, intent.order)
+                    if best_key is None or key < best_key:
+                        best, best_key = intent, key
+        return best
+
+    def match(self, message: str) -> Intent:
+        tokens = tokenize(message)
+        if not tokens:
+            return self.empty
+        with self._cache_lock:
+            cached = tokens in self._cache
+            if cached:
+                intent = self._cache[tokens]
+                self._cache.move_to_end(tokens)
+        if not cached:
+            intent = self._scan(tokens)
+            if self.cache_size:
+                with self._cache_lock:
+                    self._cache[tokens] = intent
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return intent or self.default
+
+    def reply(self, message: str, **fields) -> str:
+        return self.match(message).render(**fields)
@@ -0,0 +1,94 @@
+"""In-memory leaderboard cache.
+
+Keeps the top ``size`` users ordered by ``(points DESC, id ASC)`` together
+with a histogram of how many users hold each points value. Points only move
+in steps of 50 within a small range, so the histogram has a handful of
+buckets and a rank lookup (``1 + users with more points``) is a sum over
+those buckets instead of a table scan.
+
+Both structures are loaded through caller-supplied functions (the app reads
+the histogram from its ``points`` analytics counters), updated
+incrementally by ``record_points`` when a user's points change in this
+process, and reloaded after ``ttl`` seconds so other workers' changes show up.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+Entry = Tuple[int, str, int]  # (user_id, username, points)
+
+
+def _key(entry: Entry):
+    return (-entry[2], entry[0])
+
+
+class Leaderboard:
+    def __init__(self, load_top: Callable[[int], List[Entry]], load_histogram: Callable[[], Dict[int, int]],
+                 size: int = 100, ttl: float = 30.0):
+        self.load_top = load_top
+        self.load_histogram = load_histogram
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._top: Optional[List[Entry]] = None
+        self._complete = False  # True when _top holds every user (fewer than `size`)
+        self._histogram: Optional[Dict[int, int]] = None
+        self._loaded_at = 0.0
+
+    def _ensure_loaded(self):
+        if self._top is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        top = self.load_top(self.size)
+        self._top = sorted(top, key=_key)
+        self._complete = len(top) < self.size
+        self._histogram = dict(self.load_histogram())
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._top = None
+            self._histogram = None
+
+    def top(self) -> List[Entry]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._top)
+
+    def rank_of_points(self, points: int) -> int:
+        """Competition rank (1 + number of users with strictly more points)."""
+        with self._lock:
+            self._ensure_loaded()
+            return 1 + sum(n for p, n in self._histogram.items() if p > points)
+
+    def total_users(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return sum(self._histogram.values())
+
+    def record_points(self, user_id: int, username: str, old_points: Optional[int], new_points: int):
+        """Apply a points change (``old_points=None`` for a new user)."""
+        with self._lock:
+            if self._top is None:
+                return
+            if old_points is not None:
+                remaining = self._histogram.get(old_points, 0) - 1
+                if remaining > 0:
+                    self._histogram[old_points] = remaining
+                else:
+                    self._histogram.pop(old_points, None)
+            self._histogram[new_points] = self._histogram.get(new_points, 0) + 1
+
+            top = [e for e in self._top if e[0] != user_id]
+            was_listed = len(top) != len(self._top)
+            entry = (user_id, username, new_points)
+            if self._complete or (top and _key(entry) < _key(top[-1])):
+                top.append(entry)
+                top.sort(key=_key)
+            elif was_listed:
+                # the user fell out of a full top list; the next-best user is unknown
+                self._top = None
+                return
+            if len(top) > self.size:
+                top = top[:self.size]
+                self._complete = False
+            self._top = top
@@ -10,12 +10,18 @@ let projectTasks = [];
 let unlockedIndex = parseInt(localStorage.getItem("unlockedIndex")) || 0;
 let completedProjects = JSON.parse(localStorage.getItem("completedProjects")) || [];
 let userPoints = parseInt(localStorage.getItem("userPoints")) || 0;
+// Last known server-side user state (/api/user); kept current by responses and the event stream
+let userState = null;
 
 // Ensure localStorage keys exist (defaults)
 if (!localStorage.getItem("unlockedIndex")) localStorage.setItem("unlockedIndex", "0");
 if (!localStorage.getItem("completedProjects")) localStorage.setItem("completedProjects", "[]");
 if (!localStorage.getItem("userPoints")) localStorage.setItem("userPoints", "0");
 
+// GET responses keyed by URL: { etag, data }. Revalidated with If-None-Match so
+// unchanged resources come back as an empty 304 instead of the full payload.
+const etagCache = new Map();
+
 // Helper: safe fetch wrapper for JSON
 async function fetchJSON(url, opts = {}) {
   try {
@@ -25,8 +31,16 @@ async function fetchJSON(url, opts = {}) {
       else if (url === 'user') { console.warn('Normalized short path "user" to "/api/user"'); url = '/api/user'; }
     }
     const fullUrl = url.startsWith('http') ? url : `${API_URL}${url}`;
-    const res = await fetch(fullUrl, Object.assign({ headers: { 'Content-Type': 'application/json' }, credentials: 'include' }, opts));
-
+    const isGet = !opts.method || opts.method.toUpperCase() === 'GET';
+    const headers = { 'Content-Type': 'application/json' };
+    const cached = isGet ? etagCache.get(fullUrl) : null;
+    if (cached) headers['If-None-Match'] = cached.etag;
+    const res = await fetch(fullUrl, Object.assign({ headers, credentials: 'include' }, opts));
+
+    if (res.status === 304 && cached) {
+      // hand out a copy so callers can't mutate the cached object
+      return JSON.parse(JSON.stringify(cached.data));
+    }
 
     // read raw text first (safer when server returns non-JSON or empty body)
     const text = await res.text();
@@ -41,6 +55,10 @@ async function fetchJSON(url, opts = {}) {
       throw { message: err, status: res.status, raw: text };
     }
 
+    const etag = res.headers.get('ETag');
+    // entries never go stale: the server compares the tag on every request
+    if (isGet && etag && data !== null) etagCache.set(fullUrl, { etag, data: JSON.parse(text) });
+
     return data;
   } catch (err) {
     console.error('fetchJSON error', url, err);
@@ -111,10 +129,14 @@ async function logout() {
     console.warn('Logout request failed', e);
   }
   // clear UI state
+  stopEventStream();
+  etagCache.clear();
+  userState = null;
   unlockedIndex = 0;
   completedProjects = [];
   userPoints = 0;
   const ui = document.getElementById('user-info'); if (ui) ui.innerText = '';
+  resetChatState();
   updatePointsDisplay();
   showBadges();
   showPage('login-page');
@@ -145,7 +167,7 @@ function renderProjects() {
     } else {
       card.innerHTML = `
         <div class="mini-chart" aria-hidden="true"><canvas id="project-mini-chart-${i}"></canvas></div>
-        <img src="${p.image}" class="project-image">
+        ${projectImageHTML(p)}
         <h3>${p.name} ${completedProjects.includes(i) ? "✔" : ""}</h3>
         <p>${p.description}</p>
         <button class="btnn" onclick="selectProject(${i})">Open Project</button>
@@ -160,6 +182,16 @@ function renderProjects() {
   try { renderProjectMiniCharts(); } catch (e) { /* ignore */ }
 }
 
+// Project images: built deployments send resized WebP/JPEG srcsets in `image_sources`
+function projectImageHTML(p) {
+  const sources = p.image_sources;
+  if (!sources) return `<img src="${p.image}" class="project-image">`;
+  const sizes = '(max-width: 600px) 100vw, 320px';
+  const webp = sources.webp ? `<source type="image/webp" srcset="${sources.webp}" sizes="${sizes}">` : '';
+  const jpeg = sources.jpeg ? ` srcset="${sources.jpeg}" sizes="${sizes}"` : '';
+  return `<picture>${webp}<img src="${p.image}"${jpeg} class="project-image" loading="lazy" decoding="async"></picture>`;
+}
+
 function renderProjectMiniCharts() {
   // destroy previous mini charts
   try {
@@ -230,12 +262,12 @@ function selectProject(index) {
 
   titleEl.innerText = projects[index].name;
   descEl.innerText = projects[index].description;
-  imgEl.innerHTML = `<img src="${projects[index].image}" class="project-image">`;
+  imgEl.innerHTML = projectImageHTML(projects[index]);
 
   // fetch user's task completion for this project from server
   (async () => {
     try {
-      const user = await fetchJSON('/api/user');
+      const user = userState || await fetchJSON('/api/user');
       const completion = (user.task_completion && user.task_completion[String(index)]) || [];
       renderTasks(index, completion);
       renderChart(index, completion);
@@ -313,13 +345,15 @@ async function renderResearchCharts() {
     }
   } catch (e) { /* ignore */ }
 
-  // Try to get user state from server; if not available fallback to localStorage
-  let user = null;
-  try {
-    const res = await fetchJSON('/api/user');
-    if (res && res.logged_in) user = res;
-  } catch (e) {
-    user = null;
+  // Prefer the cached server state; fetch it once if missing, fall back to localStorage
+  let user = userState;
+  if (!user) {
+    try {
+      const res = await fetchJSON('/api/user');
+      if (res && res.logged_in) user = userState = res;
+    } catch (e) {
+      user = null;
+    }
   }
 
   projects.forEach((p, i) => {
@@ -474,30 +508,44 @@ function renderTasks(index, completionFromServer) {
   });
 }
 
-async function toggleTask(p, t, checked) {
+// Checkbox changes are collected for a short while and sent as one batch request
+const TASK_FLUSH_DELAY_MS = 400;
+let pendingTaskOps = new Map();
+let taskFlushTimer = null;
+
+function toggleTask(p, t, checked) {
+  // the latest state of each checkbox wins; the server applies the batch in one transaction
+  pendingTaskOps.set(`${p}:${t}`, { project_index: p, task_index: t, checked });
+  if (taskFlushTimer) clearTimeout(taskFlushTimer);
+  taskFlushTimer = setTimeout(flushTaskOps, TASK_FLUSH_DELAY_MS);
+}
+
+async function flushTaskOps(opts = {}) {
+  if (taskFlushTimer) { clearTimeout(taskFlushTimer); taskFlushTimer = null; }
+  if (!pendingTaskOps.size) return;
+  const tasks = Array.from(pendingTaskOps.values());
+  pendingTaskOps = new Map();
   try {
-    await fetchJSON('/api/user/progress/task', { method: 'POST', body: JSON.stringify({ project_index: p, task_index: t, checked }) });
-    // update chart using server-side state (fetch /api/user)
-    try {
-      const user = await fetchJSON('/api/user');
-      const completion = (user.task_completion && user.task_completion[String(p)]) || [];
-      renderChart(p, completion);
-      // update small research charts to reflect this change
-      try { renderResearchCharts(); } catch (e) { /* ignore */ }
-    } catch (e) {
-      renderChart(p);
-      try { renderResearchCharts(); } catch (ee) { /* ignore */ }
-    }
+    const res = await fetchJSON('/api/user/progress/batch', Object.assign({ method: 'POST', body: JSON.stringify({ tasks }) }, opts));
+    // the response carries the resulting progress state; no refetch needed
+    applyProgress({ task_completion: res.task_completion || {} });
   } catch (err) {
     // fallback to localStorage when server not available
     let completion = JSON.parse(localStorage.getItem("taskCompletion")) || {};
-    if (!completion[p]) completion[p] = [];
-    completion[p][t] = checked;
+    tasks.forEach(({ project_index: p, task_index: t, checked }) => {
+      if (!completion[p]) completion[p] = [];
+      completion[p][t] = checked;
+    });
     localStorage.setItem("taskCompletion", JSON.stringify(completion));
-    renderChart(p);
+    tasks.forEach(({ project_index: p }) => renderChart(p));
   }
 }
 
+// don't lose pending checkbox changes when the tab is hidden or closed
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') flushTaskOps({ keepalive: true });
+});
+
 /* ================= CHART ================= */
 function renderChart(index, completionFromServer) {
   const canvas = document.getElementById("projectChart");
@@ -547,6 +595,8 @@ async function completeProject() {
   const index = (typeof window._currentProject !== 'undefined') ? window._currentProject : parseInt(localStorage.getItem("currentProject"));
   if (isNaN(index)) return alert('No project selected');
 
+  // send outstanding checkbox changes first so the completion sees them
+  await flushTaskOps();
   try {
     const res = await fetchJSON('/api/user/progress/complete', { method: 'POST', body: JSON.stringify({ project_index: index }) });
     if (res && res.success) {
@@ -554,6 +604,7 @@ async function completeProject() {
       unlockedIndex = res.unlocked_index;
       completedProjects = res.completed_projects;
       userPoints = res.points;
+      if (userState) Object.assign(userState, { unlocked_index: res.unlocked_index, completed_projects: res.completed_projects, points: res.points });
       updatePointsDisplay();
       showBadges();
       renderProjects();
@@ -668,6 +719,8 @@ async function loadUserState() {
   try {
     const user = await fetchJSON('/api/user');
     if (user && user.logged_in) {
+      userState = user;
+      startEventStream();
       unlockedIndex = parseInt(user.unlocked_index) || 0;
       completedProjects = user.completed_projects || [];
       userPoints = parseInt(user.points) || 0;
@@ -684,6 +737,53 @@ async function loadUserState() {
   }
 }
 
+// Merge a progress change (from a mutation response or the event stream) into local state
+function applyProgress(change) {
+  if (!change) return;
+  if (userState) Object.assign(userState, change);
+  if ('unlocked_index' in change) unlockedIndex = parseInt(change.unlocked_index) || 0;
+  if ('completed_projects' in change) completedProjects = change.completed_projects || [];
+  if ('points' in change) userPoints = parseInt(change.points) || 0;
+  if ('task_completion' in change && typeof window._currentProject !== 'undefined') {
+    const p = window._currentProject;
+    const completion = (change.task_completion || {})[String(p)] || [];
+    // sync checkboxes in place so a change made in another tab shows up here
+    (projectTasks[p] || []).forEach((_, i) => {
+      const box = document.getElementById(`task-${p}-${i}`);
+      if (box && !pendingTaskOps.has(`${p}:${i}`)) box.checked = !!completion[i];
+    });
+    renderChart(p, completion);
+  }
+  if ('points' in change || 'completed_projects' in change || 'unlocked_index' in change) {
+    updatePointsDisplay();
+    showBadges();
+    renderProjects();
+    updateProjectsProgressBar();
+  }
+  try { renderResearchCharts(); } catch (e) { /* ignore */ }
+}
+
+/* ================= EVENT STREAM ================= */
+// Server-Sent Events push chat replies and progress changes so the page never has to re-poll /api/user
+let eventSource = null;
+
+function startEventStream() {
+  if (eventSource || typeof EventSource === 'undefined') return;
+  eventSource = new EventSource(`${API_URL}/api/stream`, { withCredentials: true });
+  eventSource.addEventListener('progress', (e) => {
+    try { applyProgress(JSON.parse(e.data)); } catch (err) { console.warn('bad progress event', err); }
+  });
+  eventSource.addEventListener('chat', (e) => {
+    // before the chat has been opened there is nothing to merge into
+    if (!chatLoaded) return;
+    try { mergeChatMessages(JSON.parse(e.data).messages); } catch (err) { console.warn('bad chat event', err); }
+  });
+}
+
+function stopEventStream() {
+  if (eventSource) { eventSource.close(); eventSource = null; }
+}
+
 initializeApp();
 
 /* ================= RESET PROGRESS ================= */
@@ -691,7 +791,7 @@ async function resetProgress() {
   if (!confirm('Reset all progress?')) return;
   try {
     await fetchJSON('/api/user/progress/reset', { method: 'POST' });
-    await loadUserState();
+    applyProgress({ task_completion: {}, completed_projects: [], unlocked_index: 0, points: 0 });
     alert('Progress reset on server.');
   } catch (err) {
     // fallback to local
@@ -744,7 +844,7 @@ function renderChatHistory(history) {
 }
 
 function appendChatMessage(who, text, time) {
-  if (!chatMessages) return;
+  if (!chatMessages) return null;
   const el = document.createElement('div');
   el.className = 'chat-msg ' + (who === 'bot' ? 'bot' : 'user');
   const txt = document.createElement('div'); txt.className = 'chat-text'; txt.innerText = text;
@@ -752,41 +852,105 @@ function appendChatMessage(who, text, time) {
   el.appendChild(txt); el.appendChild(meta);
   chatMessages.appendChild(el);
   chatMessages.scrollTop = chatMessages.scrollHeight;
+  return el;
+}
+
+// cursor for paging back through older chat messages (null when fully loaded)
+let chatNextBefore = null;
+let chatLoadingOlder = false;
+// id of the newest message rendered locally; the server only sends messages after it
+let chatLastId = 0;
+let chatLoaded = false;
+
+// Append server messages we have not rendered yet (messages carry increasing ids)
+function mergeChatMessages(messages) {
+  (messages || []).forEach(m => {
+    if (m.id && m.id <= chatLastId) return;
+    appendChatMessage(m.who, m.text, m.time);
+    if (m.id) chatLastId = m.id;
+  });
+}
+
+function resetChatState() {
+  chatLastId = 0;
+  chatLoaded = false;
+  chatNextBefore = null;
+  if (chatMessages) chatMessages.innerHTML = '';
 }
 
 async function loadChatHistory() {
   try {
+    if (chatLoaded) {
+      // already have a local copy: fetch only what arrived since (e.g. from another tab)
+      let res;
+      do {
+        res = await fetchJSON(`/api/chat?since=${chatLastId}`);
+        if (res && res.success) mergeChatMessages(res.history);
+      } while (res && res.success && res.has_more);
+      return;
+    }
     const res = await fetchJSON('/api/chat');
-    if (res && res.success) renderChatHistory(res.history || []);
+    if (res && res.success) {
+      renderChatHistory(res.history || []);
+      chatNextBefore = res.has_more ? res.next_before : null;
+      chatLastId = res.last_id || 0;
+      chatLoaded = true;
+    }
   } catch (e) {
     appendChatMessage('bot', 'Chat unavailable (server offline or not authenticated).', new Date().toISOString());
   }
 }
 
+// Fetch the page of messages preceding the oldest one shown and prepend it
+async function loadOlderChatHistory() {
+  if (!chatMessages || !chatNextBefore || chatLoadingOlder) return;
+  chatLoadingOlder = true;
+  try {
+    const res = await fetchJSON(`/api/chat?before=${encodeURIComponent(chatNextBefore)}`);
+    if (res && res.success) {
+      const prevHeight = chatMessages.scrollHeight;
+      const first = chatMessages.firstChild;
+      (res.history || []).forEach(m => {
+        appendChatMessage(m.who, m.text, m.time);
+        chatMessages.insertBefore(chatMessages.lastChild, first);
+      });
+      // keep the viewport anchored on the message the user was looking at
+      chatMessages.scrollTop = chatMessages.scrollHeight - prevHeight;
+      chatNextBefore = res.has_more ? res.next_before : null;
+    }
+  } catch (e) {
+    console.warn('Could not load older chat messages', e);
+  } finally {
+    chatLoadingOlder = false;
+  }
+}
+
 async function sendChatMessage() {
   if (!chatInput) return;
   const text = chatInput.value.trim();
   if (!text) return;
-  // optimistically append
-  appendChatMessage('user', text, new Date().toISOString());
+  // optimistically append, plus a temporary typing indicator
+  const pending = [appendChatMessage('user', text, new Date().toISOString())];
   chatInput.value = '';
-  // show a temporary typing indicator
-  const typingId = 'typing-' + Date.now();
-  appendChatMessage('bot', '…', new Date().toISOString());
+  pending.push(appendChatMessage('bot', '…', new Date().toISOString()));
+  const clearPending = () => pending.forEach(el => { if (el) el.remove(); });
   try {
     const res = await fetchJSON('/api/chat', { method: 'POST', body: JSON.stringify({ message: text }) });
-    // remove the last bot 'typing' message and render history returned by server
-    // simple strategy: clear and re-render server history if provided
+    clearPending();
     if (res && res.success) {
-      if (Array.isArray(res.history)) renderChatHistory(res.history);
-      else if (res.reply) {
-        // append bot reply
-        appendChatMessage('bot', res.reply.text || res.reply, new Date().toISOString());
+      const messages = res.messages || [];
+      // a gap means another tab wrote in between: catch up before appending our pair
+      if (messages.length && messages[0].id && chatLastId && messages[0].id > chatLastId + 1) {
+        await loadChatHistory();
       }
+      if (messages.length) mergeChatMessages(messages);
+      else if (res.reply) appendChatMessage('bot', res.reply.text || res.reply, res.reply.time);
     } else {
-      appendChatMessage('bot', res.message || 'No reply from server', new Date().toISOString());
+      appendChatMessage('bot', (res && res.message) || 'No reply from server', new Date().toISOString());
     }
   } catch (err) {
+    clearPending();
+    appendChatMessage('user', text, new Date().toISOString());
     appendChatMessage('bot', 'Failed to send message (server offline or not authenticated).', new Date().toISOString());
   }
 }
@@ -811,4 +975,5 @@ if (chatBox) {
   if (closeBtn) closeBtn.addEventListener('click', (e) => { e.stopPropagation(); chatBox.classList.add('hidden'); });
   if (chatSend) chatSend.addEventListener('click', sendChatMessage);
   if (chatInput) chatInput.addEventListener('keydown', (e) => { if (e.key === 'Enter') sendChatMessage(); });
+  if (chatMessages) chatMessages.addEventListener('scroll', () => { if (chatMessages.scrollTop === 0) loadOlderChatHistory(); });
 }
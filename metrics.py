@@ -0,0 +1,269 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+``MetricsRegistry`` hands out counters, gauges and histograms keyed by a
+fixed tuple of label values and renders them in the Prometheus text format
+(version 0.0.4).
+
+With a single process the registry is read directly. Several gunicorn
+workers each have their own registry, so a scrape would only see whichever
+worker answered; pass ``shared_dir`` and every process periodically writes a
+snapshot to ``<shared_dir>/<pid>-<start time>.json``. Rendering then merges
+the snapshots of all workers: counters and histograms are summed (including
+those of workers that have exited, so totals never go backwards) and gauges
+are summed over live workers only. The start time keeps a worker that is
+given a dead worker's pid from overwriting that worker's snapshot; of several
+snapshots with one pid only the newest can belong to a live process.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, object] = {}
+
+    def _key(self, labelvalues) -> Labels:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(v) for v in labelvalues)
+
+    def describe(self) -> dict:
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        key = self._key(labelvalues)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+            self.registry.dirty = True
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        key = self._key(labelvalues)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+            self.registry.dirty = True
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float):
+        key = self._key(labelvalues)
+        with self.registry.lock:
+            self.values[key] = float(value)
+            self.registry.dirty = True
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; each value is ``[bucket counts..., sum, count]``."""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def describe(self) -> dict:
+        return dict(super().describe(), buckets=list(self.buckets))
+
+    def observe(self, value: float, *labelvalues):
+        key = self._key(labelvalues)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+            self.registry.dirty = True
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_str(names, values, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, shared_dir: Optional[str] = None, flush_interval: float = 1.0):
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.shared_dir = shared_dir
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, Metric] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._snapshot_name: Optional[str] = None
+        self._created_pid = os.getpid()
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    # -- multi-process ------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self.dirty = False
+            return {
+                name: dict(m.describe(), samples=[[list(k), list(v) if isinstance(v, list) else v]
+                                                  for k, v in m.values.items()])
+                for name, m in self._metrics.items()
+            }
+
+    def start(self):
+        """Start the snapshot writer thread (shared mode; once per process).
+
+        The pid is checked on every call so a registry created before
+        gunicorn forks its workers starts a writer in each worker.
+        """
+        if not self.shared_dir or self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            # created here, not in __init__, so importing the app never touches the disk
+            os.makedirs(self.shared_dir, exist_ok=True)
+            self._pid = os.getpid()
+            self._snapshot_name = f"{self._pid}-{time.time_ns()}.json"
+            if self._pid != self._created_pid:
+                # counts inherited from the parent belong to the parent's snapshot
+                for metric in self._metrics.values():
+                    metric.values.clear()
+            self.dirty = True
+        self._thread = threading.Thread(target=self._flush_loop, name='metrics-writer', daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                try:
+                    self.write_snapshot()
+                except OSError as e:
+                    print('Failed to write metrics snapshot', e)
+
+    def write_snapshot(self):
+        path = os.path.join(self.shared_dir, self._snapshot_name)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def _collect(self) -> List[Tuple[bool, dict]]:
+        """Return ``(alive, snapshot)`` for this process and, in shared mode, every worker."""
+        if not self.shared_dir:
+            return [(True, self.snapshot())]
+        self.start()
+        self.write_snapshot()
+        loaded = []
+        newest: Dict[int, int] = {}
+        for name in os.listdir(self.shared_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                # <pid>-<start time>.json; <pid>.json from older versions counts as started at 0
+                pid, _, started = name[:-5].partition('-')
+                pid, started = int(pid), int(started or 0)
+                with open(os.path.join(self.shared_dir, name), 'r', encoding='utf-8') as f:
+                    loaded.append((pid, started, json.load(f)))
+            except (ValueError, OSError):
+                continue
+            newest[pid] = max(newest.get(pid, started), started)
+        return [(started == newest[pid] and _pid_alive(pid), snapshot) for pid, started, snapshot in loaded]
+
+    # -- exposition ---------------------------------------------------------
+
+    def render(self) -> str:
+        merged: Dict[str, dict] = {}
+        for alive, snapshot in self._collect():
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, dict(data, samples={}))
+                if data['type'] == 'gauge' and not alive:
+                    continue
+                for labels, value in data['samples']:
+                    key = tuple(labels)
+                    if isinstance(value, list):
+                        current = target['samples'].get(key)
+                        target['samples'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        target['samples'][key] = target['samples'].get(key, 0) + value
+
+        lines = []
+        for name in sorted(merged):
+            data = merged[name]
+            names = data['labelnames']
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['type']}")
+            for labels, value in sorted(data['samples'].items()):
+                if data['type'] != 'histogram':
+                    lines.append(f"{name}{_label_str(names, labels)} {_format_value(value)}")
+                    continue
+                for bound, count in zip(data['buckets'], value):
+                    lines.append(f"{name}_bucket{_label_str(names, labels, ('le', _format_value(bound)))} {count}")
+                lines.append(f"{name}_bucket{_label_str(names, labels, ('le', '+Inf'))} {value[-1]}")
+                lines.append(f"{name}_sum{_label_str(names, labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_label_str(names, labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
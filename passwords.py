@@ -0,0 +1,82 @@
+"""Password hashing on a small, bounded worker pool.
+
+Hashing and verifying passwords is deliberately slow (~100 ms of CPU for
+werkzeug's default scrypt). Done inline, a burst of logins occupies every
+request thread and cheap endpoints queue up behind them. ``PasswordHasher``
+runs that work on at most ``workers`` threads (hashlib's scrypt and pbkdf2
+release the GIL, so other requests keep running meanwhile) and admits at most
+``max_queue`` further jobs; beyond that it raises ``HashingBusy`` straight
+away so the caller can answer 503 instead of piling up work.
+
+The caller's request thread still waits for its job, so ``workers +
+max_queue`` is how many request threads hashing can hold at once; it should
+stay well below the server's thread count. A job that has not started within
+``max_wait`` seconds is dropped with ``HashingBusy`` as well, so under a
+sustained burst a request thread is held for at most ``max_wait`` plus one hash.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, method: str = 'scrypt', workers: Optional[int] = None, max_queue: int = 4,
+                 max_wait: Optional[float] = 0.5, retry_after: int = 1):
+        self.method = method
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._current_prefix: Optional[str] = None
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(self.retry_after)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.max_wait)
+        except TimeoutError:
+            # still queued: give the request thread back; already running: it ends shortly
+            if future.cancel():
+                raise HashingBusy(self.retry_after)
+            return future.result()
+
+    def hash(self, password: str) -> str:
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._submit(check_password_hash, password_hash, password)
+
+    def hash_sync(self, password: str) -> str:
+        """Hash on the calling thread (CLI commands and scripts, not requests)."""
+        return generate_password_hash(password, self.method)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if ``password_hash`` was made with other parameters than ``method``."""
+        if self._current_prefix is None:
+            # werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"); hash once to learn them
+            self._current_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._current_prefix
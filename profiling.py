@@ -0,0 +1,132 @@
+"""Opt-in cProfile for individual requests.
+
+A request is profiled when it is explicitly asked for (a signed
+``X-Profile`` header, or an admin's ``?_profile=1``) or when background
+sampling picks it (1 in ``sample_every`` requests). Explicit profiles are
+written to ``output_dir`` as ``.pstats`` files that can be opened with
+``python -m pstats`` or snakeviz. Every profile also feeds a rolling summary
+of the most expensive functions over the last ``window`` profiled requests.
+
+Only one request is profiled at a time; a request that would overlap with
+another profile runs unprofiled.
+"""
+import hashlib
+import hmac
+import itertools
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# per-profile entries kept for the rolling summary
+PROFILE_TRIM = 200
+
+FuncKey = Tuple[str, int, str]
+
+
+def _function_name(key: FuncKey) -> str:
+    filename, line, name = key
+    if filename == '~':
+        return name  # builtins, e.g. "<built-in method time.sleep>"
+    # keep the package directory so flask/app.py and our app.py are distinct
+    short = os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+    return f"{short}:{line}({name})"
+
+
+class ActiveProfile:
+    def __init__(self, explicit: bool):
+        # imported on first use: most processes never profile a request
+        import cProfile
+
+        self.explicit = explicit
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+
+
+class RequestProfiler:
+    def __init__(self, output_dir: str, secret: Optional[str] = None, sample_every: int = 0, window: int = 100):
+        self.output_dir = output_dir
+        self.secret = secret.encode('utf-8') if secret else None
+        self.sample_every = max(0, int(sample_every))
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._recent: 'deque[Dict[FuncKey, tuple]]' = deque(maxlen=max(1, int(window)))
+        self.profiled = 0
+
+    # -- triggers -----------------------------------------------------------
+
+    def make_token(self, ttl: int = 3600) -> str:
+        """Return an ``X-Profile`` header value valid for ``ttl`` seconds."""
+        if self.secret is None:
+            raise RuntimeError('PROFILE_SECRET is not configured')
+        expires = str(int(time.time()) + int(ttl))
+        return f"{expires}.{hmac.new(self.secret, expires.encode(), hashlib.sha256).hexdigest()}"
+
+    def verify_token(self, token: Optional[str]) -> bool:
+        if not token or self.secret is None:
+            return False
+        expires, _, signature = token.partition('.')
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        expected = hmac.new(self.secret, expires.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def sampled(self) -> bool:
+        return bool(self.sample_every) and next(self._counter) % self.sample_every == 0
+
+    # -- profiling ----------------------------------------------------------
+
+    def start(self, explicit: bool) -> Optional[ActiveProfile]:
+        """Begin profiling the current thread, or return ``None`` if another profile is running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        active = ActiveProfile(explicit)
+        active.profile.enable()
+        return active
+
+    def stop(self, active: ActiveProfile, label: str) -> Optional[str]:
+        """Stop ``active``; returns the ``.pstats`` file name for explicit profiles."""
+        try:
+            active.profile.disable()
+        finally:
+            self._busy.release()
+        import pstats
+
+        stats = pstats.Stats(active.profile)
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TRIM]
+        with self._lock:
+            self._recent.append({key: (cc, nc, tt, ct) for key, (cc, nc, tt, ct, _callers) in entries})
+            self.profiled += 1
+        if not active.explicit:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_') or 'request'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}-{int(active.started * 1000) % 100000}.pstats"
+        stats.dump_stats(os.path.join(self.output_dir, name))
+        return name
+
+    def summary(self, limit: int = 30) -> List[dict]:
+        """Top functions by cumulative time over the recent profiled requests."""
+        totals: Dict[FuncKey, list] = {}
+        with self._lock:
+            recent = list(self._recent)
+        for profile in recent:
+            for key, (cc, nc, tt, ct) in profile.items():
+                total = totals.setdefault(key, [0, 0, 0.0, 0.0])
+                total[0] += cc
+                total[1] += nc
+                total[2] += tt
+                total[3] += ct
+        top = sorted(totals.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [
+            {'function': _function_name(key), 'calls': nc, 'primitive_calls': cc,
+             'tottime': round(tt, 6), 'cumtime': round(ct, 6)}
+            for key, (cc, nc, tt, ct) in top
+        ]
+
+    def window_size(self) -> int:
+        with self._lock:
+            return len(self._recent)
@@ -0,0 +1,223 @@
+"""Token-bucket rate limiting per route and per user or client IP.
+
+A policy such as ``POST /api/login: 10/min per ip burst 5`` gives every client
+IP a bucket of 5 tokens that refills at 10 tokens a minute; each request takes
+one token and is rejected with ``RateLimited`` (429) while the bucket is
+empty. ``per user`` buckets are keyed by the logged-in user id and fall back
+to the IP for anonymous requests. ``per username`` buckets are keyed by the
+username in the request body together with the client IP, so one student
+guessing their password does not lock out a whole class behind one NAT. A
+route of ``*`` applies to every request. When several policies apply to a
+request, tokens are taken only if every bucket has one, so a request
+rejected by one policy does not use up the client's quota on the others.
+
+Buckets live in a backend:
+
+- ``MemoryBackend``: a dict guarded by one lock, about a microsecond per
+  check; each process limits on its own, so with N workers a client gets up
+  to N times the quota.
+- ``SQLiteBackend``: one small SQLite file shared by all worker processes on
+  the host, updated in an ``IMMEDIATE`` transaction per check (tens of
+  microseconds), so the quota holds across workers.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600}
+POLICY_RE = re.compile(
+    r'^\s*(?P<method>[A-Z]+|\*)\s+(?P<route>\S+)\s*:\s*(?P<count>\d+)\s*/\s*(?P<per>\d*)\s*(?P<unit>[a-z]+)'
+    r'\s+per\s+(?P<key>username|user|ip)(?:\s+burst\s+(?P<burst>\d+))?\s*$'
+)
+
+
+class RateLimited(Exception):
+    """Raised when a bucket is empty; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: float, policy: str):
+        super().__init__(f"rate limit exceeded: {policy}")
+        self.retry_after = retry_after
+        self.policy = policy
+
+
+class Policy:
+    def __init__(self, method: str, route: str, rate: float, burst: float, key: str, spec: str = ''):
+        self.method = method
+        self.route = route
+        self.rate = rate        # tokens added per second
+        self.burst = burst      # bucket capacity
+        self.key = key          # 'user', 'username' or 'ip'
+        self.spec = spec or f"{method} {route}: {rate:g}/s per {key} burst {burst:g}"
+
+    def __repr__(self):
+        return f"Policy({self.spec!r})"
+
+
+def parse_policies(text: str) -> List[Policy]:
+    """Parse ``;``-separated policies like ``POST /api/chat: 30/min per user burst 10``.
+
+    The burst defaults to the count, i.e. a full period's worth of requests.
+    """
+    policies = []
+    for spec in filter(None, (part.strip() for part in text.split(';'))):
+        m = POLICY_RE.match(spec)
+        if m is None or m['unit'] not in PERIODS:
+            raise ValueError(f"invalid rate limit policy: {spec!r}")
+        count = int(m['count'])
+        period = int(m['per'] or 1) * PERIODS[m['unit']]
+        burst = int(m['burst']) if m['burst'] else count
+        if count <= 0 or burst <= 0:
+            raise ValueError(f"invalid rate limit policy: {spec!r}")
+        policies.append(Policy(m['method'], m['route'], count / period, burst, m['key'], spec))
+    return policies
+
+
+Bucket = Tuple[str, float, float]  # (key, rate, burst)
+
+
+def _refill(state: Optional[tuple], now: float, rate: float, burst: float) -> float:
+    """Tokens in a bucket at ``now``; ``state`` is its stored ``(tokens, updated)`` or None (full)."""
+    if state is None:
+        return burst
+    return min(burst, state[0] + (now - state[1]) * rate)
+
+
+def _waits(tokens: List[float], buckets: List[Bucket]) -> List[float]:
+    """Seconds until each bucket has a token (0 where it has one now)."""
+    return [0.0 if t >= 1.0 else (1.0 - t) / rate for t, (_, rate, _) in zip(tokens, buckets)]
+
+
+class MemoryBackend:
+    """Buckets of this process only."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets: List[Bucket], now: float) -> List[float]:
+        """Take a token from every bucket, or from none if any is empty; returns the waits."""
+        with self._lock:
+            tokens = [_refill(self._buckets.get(key), now, rate, burst) for key, rate, burst in buckets]
+            waits = _waits(tokens, buckets)
+            if any(waits):
+                return waits
+            if len(self._buckets) + len(buckets) > self.max_keys:
+                self._prune(now)
+            for (key, rate, burst), left in zip(buckets, tokens):
+                self._buckets[key] = [left - 1.0, now, burst / rate]
+            return waits
+
+    def _prune(self, now: float):
+        # a bucket idle for longer than its refill time is full again, same as a missing one
+        idle = [k for k, (_, updated, refill) in self._buckets.items() if now - updated >= refill]
+        for k in idle:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets shared by every process that opens the same SQLite file."""
+
+    def __init__(self, path: str, prune_interval: float = 60.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._last_prune = 0.0
+        self._created = False
+
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's connection; the first one creates the file and the table."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not self._created:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # bucket state is disposable: losing the last writes on power loss is fine
+            conn.execute('PRAGMA synchronous=OFF')
+            if not self._created:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS buckets ('
+                    'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, refill REAL NOT NULL)'
+                )
+                self._created = True
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets: List[Bucket], now: float) -> List[float]:
+        """Take a token from every bucket, or from none if any is empty; returns the waits."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            tokens = [_refill(conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone(),
+                              now, rate, burst) for key, rate, burst in buckets]
+            waits = _waits(tokens, buckets)
+            if not any(waits):
+                conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated, refill) VALUES (?, ?, ?, ?)',
+                                 [(key, left - 1.0, now, burst / rate) for (key, rate, burst), left in zip(buckets, tokens)])
+            if now - self._last_prune > self.prune_interval:
+                self._last_prune = now
+                conn.execute('DELETE FROM buckets WHERE ? - updated >= refill', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return waits
+
+
+class RateLimiter:
+    def __init__(self, policies: List[Policy], backend, clock=time.time):
+        self.backend = backend
+        self.clock = clock
+        self.policies = policies
+        self._by_route: Dict[Tuple[str, str], List[Policy]] = {}
+        self._wildcard = [p for p in policies if p.route == '*']
+        for p in policies:
+            if p.route != '*':
+                self._by_route.setdefault((p.method, p.route), []).append(p)
+        self._username_routes = {(p.method, p.route) for p in policies if p.key == 'username'}
+
+    def uses_username(self, method: str, route: str) -> bool:
+        """Whether ``check`` needs the submitted username for this request."""
+        return any(m in (method, '*') and r in (route, '*') for m, r in self._username_routes)
+
+    def check(self, method: str, route: str, user_id: Optional[int], ip: Optional[str], username: Optional[str] = None):
+        """Take a token from every bucket that applies, or raise ``RateLimited`` and take none.
+
+        ``retry_after`` is the wait until every bucket has a token again.
+        """
+        policies = self._by_route.get((method, route), ())
+        if self._wildcard:
+            policies = [*policies, *self._wildcard]
+        policies = [p for p in policies if p.method == '*' or p.method == method]
+        if not policies:
+            return
+        buckets = []
+        for p in policies:
+            if p.key == 'username':
+                who = f"n{username or ''}|ip{ip}"
+            else:
+                who = f"u{user_id}" if p.key == 'user' and user_id is not None else f"ip{ip}"
+            buckets.append((f"{p.method} {p.route}|{who}", p.rate, p.burst))
+        waits = self.backend.take(buckets, self.clock())
+        if any(waits):
+            wait, policy = max(zip(waits, policies), key=lambda pair: pair[0])
+            raise RateLimited(math.ceil(wait), policy.spec)
+
+
+def create_limiter(kind: str, policies: str, sqlite_path: str) -> RateLimiter:
+    """Build a limiter for ``RATE_LIMIT_BACKEND`` (``memory`` or ``sqlite``)."""
+    if kind == 'sqlite':
+        backend = SQLiteBackend(sqlite_path)
+    elif kind == 'memory':
+        backend = MemoryBackend()
+    else:
+        raise ValueError(f"unknown rate limit backend: {kind}")
+    return RateLimiter(parse_policies(policies), backend)
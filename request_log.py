@@ -0,0 +1,101 @@
+"""Structured, non-blocking request logging.
+
+Request handlers only build a small dict and hand it to ``RequestLogger.log``,
+which puts it on a bounded queue without waiting. One background thread
+drains the queue and writes each record as a JSON line. When the queue is
+full the record is dropped and counted; a slow log sink never stalls a
+request thread.
+
+Sensitive fields (``password`` and friends) are replaced with ``"***"``
+wherever they appear in a captured body.
+"""
+import json
+import queue
+import random
+import sys
+import threading
+from typing import Iterable, Optional, TextIO
+
+REDACTED = '***'
+DEFAULT_REDACT_FIELDS = ('password', 'password_hash', 'token', 'secret', 'authorization')
+
+
+def redact(value, fields: frozenset):
+    """Return ``value`` with every dict key in ``fields`` (case-insensitive) masked."""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in fields else redact(v, fields) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, fields) for v in value]
+    return value
+
+
+class RequestLogger:
+    """Queue records and write them as JSON lines from a background thread.
+
+    Records go to ``stream``, or to the file at ``path`` (appended to, and
+    opened by the writer thread when the first record arrives), or to stdout.
+    ``sample_rate`` is the fraction of requests logged (errors are always
+    logged); ``capture_body`` adds the redacted JSON body of requests up to
+    ``max_body_bytes``.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, queue_size: int = 10000, sample_rate: float = 1.0,
+                 capture_body: bool = False, max_body_bytes: int = 4096,
+                 redact_fields: Iterable[str] = DEFAULT_REDACT_FIELDS, path: Optional[str] = None):
+        self.stream = stream
+        self.path = path
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.capture_body = capture_body
+        self.max_body_bytes = max_body_bytes
+        self.redact_fields = frozenset(f.strip().lower() for f in redact_fields if f.strip())
+        self.dropped = 0
+        self._queue: 'queue.Queue[dict]' = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def redact(self, value):
+        return redact(value, self.redact_fields)
+
+    def log(self, record: dict):
+        """Enqueue ``record``; drops it (never blocks) when the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._drain, name='request-log-writer', daemon=True)
+                    self._thread.start()
+
+    def _drain(self):
+        while True:
+            lines = [self._queue.get()]
+            # write whatever else is already queued in one go
+            while len(lines) < 500:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.stream is None and self.path:
+                    self.stream = open(self.path, 'a', encoding='utf-8', buffering=1)
+                stream = self.stream or sys.stdout
+                stream.write(''.join(json.dumps(r, separators=(',', ':'), default=str) + '\n' for r in lines))
+                stream.flush()
+            except Exception as e:
+                print('Request log writer error', e, file=sys.stderr)
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self._thread is not None:
+            self._queue.join()